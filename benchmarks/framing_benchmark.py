@@ -0,0 +1,69 @@
+"""
+Compares the legacy str-based message splitting with MessageFramer on large
+`plates_data` frames delivered in TCP-sized chunks.
+
+    python -m benchmarks.framing_benchmark
+"""
+import base64
+import json
+import os
+import time
+
+from tcp_connection.framing import MessageFramer
+
+
+CHUNK_SIZE = 64 * 1024
+FRAMES = 5
+
+
+def make_frame(image_size):
+    image = base64.b64encode(os.urandom(image_size)).decode('ascii')
+    return (json.dumps({
+        "messageType": "plates_data",
+        "messageBody": {"gate": "gate_test2", "full_image": image, "cars": []}
+    }) + '\n').encode('utf-8')
+
+
+def legacy_split(chunks):
+    """
+    The splitting loop SimpleTCPClient.dataReceived used before MessageFramer.
+    """
+    incomplete_data = ""
+    frames = 0
+    for data in chunks:
+        incomplete_data += data.decode('utf-8')
+        while '\n' in incomplete_data:
+            full_message, incomplete_data = incomplete_data.split('\n', 1)
+            if full_message:
+                frames += 1
+    return frames
+
+
+def framer_split(chunks):
+    framer = MessageFramer(max_frame_size=1 << 30)
+    frames = 0
+    for data in chunks:
+        frames += len(framer.feed(data))
+    return frames
+
+
+def run(image_size):
+    stream = make_frame(image_size) * FRAMES
+    chunks = [stream[i:i + CHUNK_SIZE] for i in range(0, len(stream), CHUNK_SIZE)]
+
+    results = {}
+    for name, split in (("legacy", legacy_split), ("framer", framer_split)):
+        start = time.perf_counter()
+        frames = split(chunks)
+        results[name] = time.perf_counter() - start
+        assert frames == FRAMES, (name, frames)
+
+    frame_mb = len(stream) / FRAMES / (1024 * 1024)
+    print(f"{frame_mb:6.2f} MB/frame  legacy {results['legacy'] * 1000:9.1f} ms  "
+          f"framer {results['framer'] * 1000:7.1f} ms  "
+          f"speedup x{results['legacy'] / results['framer']:.1f}")
+
+
+if __name__ == "__main__":
+    for size in (256 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+        run(size)
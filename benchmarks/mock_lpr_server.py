@@ -0,0 +1,368 @@
+"""
+Mock LPR server for load testing the ingest pipeline without hardware.
+
+Speaks the newline-delimited JSON protocol the LPR clients expect: it
+acknowledges the authentication message, answers commands with a
+`command_response`, and streams `plates_data` and `live` messages, either
+synthetic or replayed from a capture.
+
+    # synthetic traffic: 4 gates, 10 plates_data/s each, 2 cars per frame
+    python -m benchmarks.mock_lpr_server serve --port 4500 --gates 4 --rate 10 --plates-per-frame 2
+
+    # replay a capture, looping, with its recorded timing
+    python -m benchmarks.mock_lpr_server serve --port 4500 --replay capture.jsonl --loop
+
+    # record a real LPR server's stream into a capture
+    python -m benchmarks.mock_lpr_server record --host 10.0.0.5 --port 45 --token ... --out capture.jsonl
+
+Captures are JSONL, one message per line, either wrapped with its offset
+from the start of the recording (`{"offset": 1.25, "message": {...}}`, as
+`record` writes them) or bare messages, which are paced by `--rate`.
+
+Point a `Client` row at the mock server to load the backend. With
+`--socketio-url` the tool also subscribes to the backend's Socket.IO
+server (needs the optional aiohttp package) and reports end-to-end
+latency, measured from the `timestamp` the mock server stamps on each
+plates_data message to its arrival on Socket.IO. Debouncing, when
+enabled, adds its window to that latency.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import string
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+REPORT_INTERVAL = 5.0
+# asyncio's default 64 KB line limit is far below an LPR frame
+MAX_LINE_SIZE = 64 * 1024 * 1024
+# Same as tcp_connection.pipeline.TIMESTAMP_FORMAT; not imported so the mock
+# server runs without the backend's settings and database
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def utc_timestamp():
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def random_image(size):
+    # base64 of `size` random bytes; random data does not compress, like JPEG
+    return base64.b64encode(os.urandom(size)).decode("ascii")
+
+
+def random_plate():
+    return "".join(random.choices(string.digits, k=2)) + random.choice(string.ascii_uppercase) + \
+        "".join(random.choices(string.digits, k=3))
+
+
+class SendStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.messages = {}
+        self.bytes = 0
+
+    def record(self, message_type, size):
+        self.messages[message_type] = self.messages.get(message_type, 0) + 1
+        self.bytes += size
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rates = ", ".join(f"{name} {count / elapsed:.1f}/s" for name, count in sorted(self.messages.items()))
+        return f"sent {rates or 'nothing'}, {self.bytes / elapsed / (1024 * 1024):.2f} MB/s"
+
+
+class SyntheticTraffic:
+    """
+    Generates plates_data and live messages for `gates` gates.
+    Each gate sends `rate` plates_data messages per second with
+    `plates_per_frame` cars and a scene image of about `frame_size` bytes,
+    plus `live_rate` live frames per second.
+    """
+
+    def __init__(self, gates, rate, live_rate, plates_per_frame, frame_size, plate_pool):
+        self.gates = [f"gate-{i + 1}" for i in range(gates)]
+        self.rate = rate
+        self.live_rate = live_rate
+        self.plates_per_frame = plates_per_frame
+        # Raw size of the image bytes before base64
+        self.image_size = frame_size * 3 // 4
+        self.plates = [random_plate() for _ in range(plate_pool)]
+        # Images are generated once and reused; encoding them per message
+        # would make the mock server the bottleneck
+        self.scene = random_image(self.image_size)
+        self.crop = random_image(max(self.image_size // 40, 1))
+
+    def plates_data(self, gate):
+        return {
+            "messageId": str(uuid.uuid4()),
+            "messageType": "plates_data",
+            "messageBody": {
+                "timestamp": utc_timestamp(),
+                "gate": gate,
+                "full_image": self.scene,
+                "cars": [
+                    {
+                        "plate": {"plate": random.choice(self.plates), "plate_image": self.crop},
+                        "ocr_accuracy": round(random.uniform(0.6, 0.99), 2),
+                        "vision_speed": round(random.uniform(0, 60), 1),
+                        "vehicle_class": {"name": "car"},
+                        "vehicle_type": {"name": "sedan"},
+                    }
+                    for _ in range(self.plates_per_frame)
+                ],
+            },
+        }
+
+    def live(self, gate):
+        return {
+            "messageId": str(uuid.uuid4()),
+            "messageType": "live",
+            "messageBody": {"gate": gate, "live_image": self.scene},
+        }
+
+    async def stream(self, send):
+        tasks = []
+        for gate in self.gates:
+            if self.rate > 0:
+                tasks.append(asyncio.create_task(self._every(1 / self.rate, send, self.plates_data, gate)))
+            if self.live_rate > 0:
+                tasks.append(asyncio.create_task(self._every(1 / self.live_rate, send, self.live, gate)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _every(self, interval, send, make_message, gate):
+        # Fixed schedule, so a slow send shows up as lag rather than a lower rate
+        next_time = time.perf_counter() + random.uniform(0, interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+            await send(make_message(gate))
+            next_time += interval
+
+
+class ReplayTraffic:
+    """
+    Replays a JSONL capture. Wrapped lines keep their recorded timing; bare
+    messages are sent `rate` per second. plates_data timestamps are
+    restamped so latency is measured from the replay, not the recording.
+    """
+
+    def __init__(self, path, rate, loop):
+        self.rate = rate
+        self.loop = loop
+        self.entries = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if "message" in entry and "offset" in entry:
+                    self.entries.append((entry["offset"], entry["message"]))
+                else:
+                    self.entries.append((None, entry))
+        print(f"[INFO] Loaded {len(self.entries)} messages from {path}")
+
+    async def stream(self, send):
+        while True:
+            started = time.perf_counter()
+            for index, (offset, message) in enumerate(self.entries):
+                if offset is None:
+                    offset = index / self.rate if self.rate > 0 else 0
+                await asyncio.sleep(max(0.0, started + offset - time.perf_counter()))
+                if message.get("messageType") == "plates_data":
+                    message.setdefault("messageBody", {})["timestamp"] = utc_timestamp()
+                await send(message)
+            if not self.loop:
+                return
+
+
+async def serve(args):
+    if args.replay:
+        traffic = ReplayTraffic(args.replay, args.rate, args.loop)
+    else:
+        traffic = SyntheticTraffic(args.gates, args.rate, args.live_rate, args.plates_per_frame,
+                                   args.frame_size, args.plate_pool)
+    stats = SendStats()
+
+    async def handle(reader, writer):
+        peer = writer.get_extra_info("peername")
+        print(f"[INFO] LPR client connected from {peer}")
+
+        async def send(message):
+            data = (json.dumps(message) + "\n").encode("utf-8")
+            writer.write(data)
+            # Backpressure from the client slows the mock server down
+            await writer.drain()
+            stats.record(message["messageType"], len(data))
+
+        streaming = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                message_type = message.get("messageType")
+                if message_type == "authentication":
+                    if args.token and message["messageBody"].get("token") != args.token:
+                        print(f"[ERROR] Rejected token from {peer}")
+                        break
+                    await send({"messageId": str(uuid.uuid4()), "messageType": "acknowledge",
+                                "messageBody": {"replyTo": message["messageId"]}})
+                    if streaming is None:
+                        streaming = asyncio.create_task(traffic.stream(send))
+                elif message_type == "command":
+                    await send({"messageId": str(uuid.uuid4()), "messageType": "command_response",
+                                "messageBody": {"replyTo": message["messageId"], "status": "ok"}})
+        except (ConnectionError, json.JSONDecodeError) as e:
+            print(f"[ERROR] Connection from {peer} failed: {e}")
+        finally:
+            if streaming is not None:
+                streaming.cancel()
+            writer.close()
+            print(f"[INFO] LPR client {peer} disconnected")
+
+    server = await asyncio.start_server(handle, args.host, args.port, limit=MAX_LINE_SIZE)
+    print(f"[INFO] Mock LPR server listening on {args.host}:{args.port}")
+
+    observer = LatencyObserver(args.socketio_url) if args.socketio_url else None
+    if observer is not None:
+        await observer.connect()
+
+    async with server:
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            line = stats.report()
+            if observer is not None:
+                line += " | " + observer.report()
+            print(f"[STATS] {line}")
+
+
+class LatencyObserver:
+    """
+    Socket.IO subscriber measuring the delay between the mock server stamping
+    a plates_data message and the backend delivering it.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.latencies = []
+        self.events = 0
+        self.started = time.perf_counter()
+
+    async def connect(self):
+        try:
+            import socketio
+            client = socketio.AsyncClient()
+        except (ImportError, ValueError) as e:
+            raise SystemExit(f"--socketio-url needs the Socket.IO client dependencies (aiohttp): {e}")
+
+        @client.on("message")
+        async def on_message(data):
+            if isinstance(data, str):
+                try:
+                    data = json.loads(data)
+                except json.JSONDecodeError:
+                    return
+            if isinstance(data, dict) and data.get("messageType") == "plates_data":
+                self._record(data)
+
+        await client.connect(self.url)
+        self.client = client
+
+    def _record(self, event):
+        self.events += 1
+        try:
+            sent = datetime.strptime(event["timestamp"], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        except (KeyError, TypeError, ValueError):
+            return
+        self.latencies.append((datetime.now(timezone.utc) - sent).total_seconds())
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        latencies, self.latencies = sorted(self.latencies), []
+        if not latencies:
+            return f"received {self.events / elapsed:.1f} plates_data/s"
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return (f"received {self.events / elapsed:.1f} plates_data/s, latency ms "
+                f"p50 {percentile(0.5):.1f} p95 {percentile(0.95):.1f} "
+                f"p99 {percentile(0.99):.1f} max {latencies[-1] * 1000:.1f}")
+
+
+async def record(args):
+    """
+    Connects to a real LPR server like the backend does and writes every
+    plates_data and live message it sends to a capture file.
+    """
+    reader, writer = await asyncio.open_connection(args.host, args.port, limit=MAX_LINE_SIZE)
+    writer.write((json.dumps({
+        "messageId": str(uuid.uuid4()),
+        "messageType": "authentication",
+        "messageBody": {"token": args.token},
+    }) + "\n").encode("utf-8"))
+    await writer.drain()
+
+    started = time.perf_counter()
+    recorded = 0
+    with open(args.out, "w") as out:
+        while args.duration <= 0 or time.perf_counter() - started < args.duration:
+            try:
+                line = await asyncio.wait_for(reader.readline(), 1.0)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                break
+            message = json.loads(line)
+            if message.get("messageType") not in ("plates_data", "live"):
+                continue
+            out.write(json.dumps({"offset": round(time.perf_counter() - started, 3), "message": message}) + "\n")
+            recorded += 1
+    writer.close()
+    print(f"[INFO] Recorded {recorded} messages to {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the mock LPR server")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=4500)
+    serve_parser.add_argument("--token", help="only accept this auth token")
+    serve_parser.add_argument("--gates", type=int, default=1)
+    serve_parser.add_argument("--rate", type=float, default=5, help="plates_data messages per second per gate")
+    serve_parser.add_argument("--live-rate", type=float, default=5, help="live messages per second per gate")
+    serve_parser.add_argument("--plates-per-frame", type=int, default=1)
+    serve_parser.add_argument("--frame-size", type=int, default=200 * 1024, help="base64 scene image size in bytes")
+    serve_parser.add_argument("--plate-pool", type=int, default=1000, help="distinct plates to draw from")
+    serve_parser.add_argument("--replay", help="JSONL capture to replay instead of synthetic traffic")
+    serve_parser.add_argument("--loop", action="store_true", help="replay the capture forever")
+    serve_parser.add_argument("--socketio-url", help="backend URL to measure end-to-end latency on")
+
+    record_parser = commands.add_parser("record", help="record a real LPR server's stream")
+    record_parser.add_argument("--host", required=True)
+    record_parser.add_argument("--port", type=int, required=True)
+    record_parser.add_argument("--token", required=True)
+    record_parser.add_argument("--out", required=True)
+    record_parser.add_argument("--duration", type=float, default=60, help="seconds to record, 0 for no limit")
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else record(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Seeds plate_data/image_data with synthetic history and times the plate
+search queries against it: filtered and fuzzy lookups, and keyset pages vs
+OFFSET pages at the same depth.
+
+    python -m benchmarks.plate_search_benchmark seed --rows 20000000
+    python -m benchmarks.plate_search_benchmark run --explain
+    python -m benchmarks.plate_search_benchmark cleanup
+
+Uses the database from settings. Seeded rows are on gates named
+bench_gate_<n>, so `cleanup` removes exactly them.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import main  # noqa: F401  (registers every model for the mappers)
+from db.engine import Base, async_session, engine
+from db.partitions import PARTITIONED_TABLES, ensure_partitions, is_partitioned, partition_maintainer
+from plates.fuzzy import rebuild_known_plates
+from plates.operation import fuzzy_search_plates, search_plates
+from utils.db_utils import create_indexes, upgrade_schema
+
+
+GATE_PREFIX = "bench_gate_"
+SEED_CHUNK = 1_000_000
+PAGE_SIZE = 50
+
+SEED_PLATES = """
+INSERT INTO plate_data (timestamp, plate_number, ocr_accuracy, vision_speed, gate, hits)
+SELECT localtimestamp - (g * CAST(:spacing AS double precision)) * interval '1 millisecond',
+       'B' || lpad(floor(random() * :plates)::int::text, 6, '0'),
+       random(),
+       random() * 120,
+       :gate_prefix || (g % :gates),
+       1
+FROM generate_series(:first, :last) AS g
+"""
+SEED_IMAGES = """
+INSERT INTO image_data (plate_number, gate, file_path, timestamp)
+SELECT plate_number, gate, 'images/bench/' || id || '.jpg', timestamp
+FROM plate_data WHERE gate LIKE :gate_pattern AND id > :after_id
+"""
+
+
+async def seed(rows: int, plates: int, gates: int, days: float):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+    # Partitions for every seeded month, or the rows would all land in the default partition
+    await partition_maintainer.run_once()
+    now = datetime.now()
+    oldest = now - timedelta(days=days)
+    async with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if await is_partitioned(conn, table):
+                await ensure_partitions(conn, table, oldest.date(),
+                                        (now.year - oldest.year) * 12 + now.month - oldest.month)
+    spacing = days * 86_400_000 / rows
+
+    async with engine.connect() as conn:
+        after_id = (await conn.execute(text("SELECT coalesce(max(id), 0) FROM plate_data"))).scalar()
+    start = time.perf_counter()
+    for first in range(1, rows + 1, SEED_CHUNK):
+        last = min(first + SEED_CHUNK - 1, rows)
+        async with engine.begin() as conn:
+            await conn.execute(text(SEED_PLATES), {
+                "spacing": spacing, "plates": plates, "gate_prefix": GATE_PREFIX,
+                "gates": gates, "first": first, "last": last,
+            })
+        print(f"seeded {last}/{rows} plate rows ({time.perf_counter() - start:.0f}s)")
+    async with engine.begin() as conn:
+        await conn.execute(text(SEED_IMAGES), {"gate_pattern": f"{GATE_PREFIX}%", "after_id": after_id})
+    print("seeded image rows")
+
+    async with engine.begin() as conn:
+        await rebuild_known_plates(conn)
+    print("rebuilt known plates")
+
+    await create_indexes(engine)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE plate_data"))
+        await conn.execute(text("ANALYZE image_data"))
+    print(f"done in {time.perf_counter() - start:.0f}s")
+
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM image_data WHERE gate LIKE :pattern"), {"pattern": f"{GATE_PREFIX}%"})
+        await conn.execute(text("DELETE FROM plate_data WHERE gate LIKE :pattern"), {"pattern": f"{GATE_PREFIX}%"})
+        await rebuild_known_plates(conn)
+    print("removed benchmark rows")
+
+
+async def timed(label: str, **filters):
+    """
+    Walks up to `pages` pages of one search with cursors, prints the time
+    of the first and the last page and returns how many pages it walked.
+    """
+    pages = filters.pop("pages")
+    cursor = None
+    timings = []
+    async with async_session() as session:
+        for _ in range(pages):
+            start = time.perf_counter()
+            page = await search_plates(session, cursor=cursor, limit=PAGE_SIZE, **filters)
+            timings.append(time.perf_counter() - start)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+    print(f"{label:<40} first page {timings[0] * 1000:8.2f} ms   page {len(timings):>4} {timings[-1] * 1000:8.2f} ms")
+    return len(timings)
+
+
+async def timed_fuzzy(label: str, plate_number: str):
+    async with async_session() as session:
+        start = time.perf_counter()
+        candidates = await fuzzy_search_plates(session, plate_number)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<40} {len(candidates):>3} candidates {elapsed * 1000:16.2f} ms")
+
+
+async def timed_offset(label: str, depth: int):
+    async with engine.connect() as conn:
+        start = time.perf_counter()
+        await conn.execute(text(
+            "SELECT * FROM plate_data ORDER BY timestamp DESC, id DESC OFFSET :offset LIMIT :limit"
+        ), {"offset": depth * PAGE_SIZE, "limit": PAGE_SIZE})
+        elapsed = time.perf_counter() - start
+    print(f"{label:<40} {'':>19}page {depth + 1:>4} {elapsed * 1000:8.2f} ms")
+
+
+async def explain():
+    async with engine.connect() as conn:
+        plate = (await conn.execute(text(
+            "SELECT plate_number FROM plate_data WHERE gate LIKE :pattern LIMIT 1"
+        ), {"pattern": f"{GATE_PREFIX}%"})).scalar()
+        for label, sql in (
+            ("plate", "SELECT * FROM plate_data WHERE plate_number = :plate ORDER BY timestamp DESC, id DESC LIMIT 51"),
+            ("gate", "SELECT * FROM plate_data WHERE gate = :gate ORDER BY timestamp DESC, id DESC LIMIT 51"),
+        ):
+            plan = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), {"plate": plate, "gate": f"{GATE_PREFIX}0"})
+            print(f"\n-- {label}")
+            for (line,) in plan:
+                print(line)
+
+
+async def run(pages: int, show_plans: bool):
+    async with engine.connect() as conn:
+        plate = (await conn.execute(text(
+            "SELECT plate_number FROM plate_data WHERE gate LIKE :pattern LIMIT 1"
+        ), {"pattern": f"{GATE_PREFIX}%"})).scalar()
+        newest = (await conn.execute(text("SELECT max(timestamp) FROM plate_data"))).scalar()
+    if plate is None:
+        raise SystemExit("No benchmark rows; run the seed command first")
+
+    await timed("plate", plate_number=plate, pages=pages)
+    await timed("gate", gate=f"{GATE_PREFIX}0", pages=pages)
+    await timed("gate + min_accuracy 0.9", gate=f"{GATE_PREFIX}0", min_accuracy=0.9, pages=pages)
+    await timed("last hour", start=newest.replace(minute=0, second=0, microsecond=0), pages=pages)
+    # One substituted and one dropped character
+    await timed_fuzzy("fuzzy, one wrong character", plate[:-1] + ("0" if plate[-1] != "0" else "1"))
+    await timed_fuzzy("fuzzy, one missing character", plate[:3] + plate[4:])
+    depth = await timed("everything (keyset)", pages=pages)
+    await timed_offset("everything (OFFSET)", depth - 1)
+    if show_plans:
+        await explain()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed", help="insert synthetic plate history")
+    seed_parser.add_argument("--rows", type=int, default=1_000_000)
+    seed_parser.add_argument("--plates", type=int, default=200_000, help="distinct plate numbers")
+    seed_parser.add_argument("--gates", type=int, default=20)
+    seed_parser.add_argument("--days", type=float, default=365, help="time span the rows are spread over")
+    run_parser = commands.add_parser("run", help="time the search queries")
+    run_parser.add_argument("--pages", type=int, default=200, help="pages to walk per query")
+    run_parser.add_argument("--explain", action="store_true", help="print the query plans")
+    commands.add_parser("cleanup", help="delete the seeded rows")
+    args = parser.parse_args()
+
+    async def dispatch():
+        # The app engine logs every statement
+        engine.sync_engine.echo = False
+        try:
+            if args.command == "seed":
+                await seed(args.rows, args.plates, args.gates, args.days)
+            elif args.command == "run":
+                await run(args.pages, args.explain)
+            else:
+                await cleanup()
+        finally:
+            await engine.dispose()
+    asyncio.run(dispatch())
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Enum, Float, Integer, String, ForeignKey, Boolean, DateTime, Text, Table, func
+from sqlalchemy import Column, Enum, Float, Integer, String, ForeignKey, Boolean, Date, DateTime, Text, Table, Index, func
 from sqlalchemy import Enum as sqlEnum
 from sqlalchemy.orm import relationship
 from enum import Enum
@@ -61,13 +61,26 @@ class LPR(Base):
 class PlateData(Base):
     __tablename__ = 'plate_data'
 
+    # Partitioned by month on timestamp (db/partitions.py), which must then be part of the key
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     # timestamp = Column(String, nullable=False, default=func.now())
-    timestamp = Column(DateTime, nullable=False, default=func.now())
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=func.now())
     plate_number = Column(String, nullable=False)
     ocr_accuracy = Column(Float, nullable=True)
     vision_speed = Column(Float, nullable=True)
     gate = Column(String, nullable=True)
+    # Number of sightings merged into this row by the plate debouncer
+    hits = Column(Integer, nullable=False, default=1, server_default="1")
+    # Image store key of the scene image, when the sampling policy kept it
+    scene_image_key = Column(String, nullable=True)
+
+    # History search walks (timestamp, id) backwards, optionally within one plate or gate
+    __table_args__ = (
+        Index('ix_plate_data_timestamp_id', 'timestamp', 'id'),
+        Index('ix_plate_data_plate_number_timestamp_id', 'plate_number', 'timestamp', 'id'),
+        Index('ix_plate_data_gate_timestamp_id', 'gate', 'timestamp', 'id'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
 
 class ImageData(Base):
@@ -76,5 +89,70 @@ class ImageData(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     plate_number = Column(String, nullable=False)
     gate = Column(String, nullable=True)
-    file_path = Column(String, nullable=False)  # Path to the saved image
-    timestamp = Column(DateTime, nullable=False, default=func.now())
+    file_path = Column(String, nullable=False)  # Image store key of the saved image
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=func.now())
+
+    # Plate crops are looked up for a plate row by (plate_number, gate, timestamp)
+    __table_args__ = (
+        Index('ix_image_data_plate_number_gate_timestamp', 'plate_number', 'gate', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+
+# Traffic rollups, updated by the plate writer in the same transaction as the
+# plate rows (plates/rollups.py). Gate '' stands for rows without a gate.
+
+class GateHourlyTraffic(Base):
+    __tablename__ = 'gate_hourly_traffic'
+
+    gate = Column(String, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    vehicles = Column(Integer, nullable=False, default=0)
+    sightings = Column(Integer, nullable=False, default=0)
+    # Sums and counts rather than averages, so that updates only ever add
+    ocr_accuracy_sum = Column(Float, nullable=False, default=0)
+    ocr_accuracy_count = Column(Integer, nullable=False, default=0)
+    vision_speed_sum = Column(Float, nullable=False, default=0)
+    vision_speed_count = Column(Integer, nullable=False, default=0)
+
+
+class GateDailyTraffic(Base):
+    __tablename__ = 'gate_daily_traffic'
+
+    # Gate '*' counts plates seen at any gate
+    gate = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    unique_plates = Column(Integer, nullable=False, default=0)
+
+
+class DailyPlate(Base):
+    """
+    Plates already counted in `GateDailyTraffic.unique_plates`.
+    """
+    __tablename__ = 'daily_plates'
+
+    day = Column(Date, primary_key=True)
+    gate = Column(String, primary_key=True)
+    plate_key = Column(String, primary_key=True)
+
+    # Fuzzy search checks whether a candidate plate was seen at a gate in a period
+    __table_args__ = (
+        Index('ix_daily_plates_plate_key_gate_day', 'plate_key', 'gate', 'day'),
+    )
+
+
+class KnownPlate(Base):
+    """
+    One row per distinct normalised plate ever read, updated by the plate
+    writer with the plate rows (plates/fuzzy.py). Fuzzy search matches
+    trigrams against these instead of every plate_data row; the trigram
+    index is in SCHEMA_INDEXES, as it needs pg_trgm.
+    """
+    __tablename__ = 'known_plates'
+
+    plate_key = Column(String, primary_key=True)
+    # Most recent raw reading
+    plate_number = Column(String, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    sightings = Column(Integer, nullable=False, default=0)
@@ -55,6 +55,54 @@ async def create_client(db: AsyncSession, client):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+async def get_client(db: AsyncSession, client_id: int):
+    result = await db.execute(select(Client).where(Client.id == client_id))
+    client = result.unique().scalars().first()
+
+    if client is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="client not found")
+    return client
+
+async def get_clients(db: AsyncSession, skip: int = 0, limit: int = 10):
+    result = await db.execute(select(Client).order_by(Client.id).offset(skip).limit(limit))
+    return result.unique().scalars().all()
+
+async def update_client(db: AsyncSession, client_id: int, client):
+    db_client = await get_client(db, client_id)
+    update_data = client.dict(exclude_unset=True)
+
+    if "lpr_id" in update_data:
+        await get_lpr(db, update_data["lpr_id"])
+
+    camera_ids = update_data.pop("camera_ids", None)
+    if camera_ids is not None:
+        camera_result = await db.execute(select(Camera).where(Camera.id.in_(camera_ids)))
+        cameras = camera_result.unique().scalars().all()
+        if len(cameras) != len(camera_ids):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="One or more cameras not found")
+        db_client.cameras = list(cameras)
+
+    for key, value in update_data.items():
+        setattr(db_client, key, value)
+    try:
+        await db.commit()
+        await db.refresh(db_client)
+        return db_client
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+async def delete_client(db: AsyncSession, client_id: int):
+    db_client = await get_client(db, client_id)
+    try:
+        await db.delete(db_client)
+        await db.commit()
+        return db_client
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 async def get_lpr(db: AsyncSession, lpr_id: int):
     result = await db.execute(select(LPR).where(LPR.id == lpr_id).options(selectinload(LPR.clients)))
     lpr =  result.unique().scalars().first()
@@ -4,17 +4,56 @@ from sqlalchemy.future import select
 from typing import List
 
 from db.engine import get_db
-from client.schemas import ClientInDB, LPRCreate, LPRUpdate, LPRInDB, ClientCreate
-from client.operation import get_lpr, get_lprs, create_lpr, update_lpr, delete_lpr, create_client
+from client.schemas import ClientInDB, LPRCreate, LPRUpdate, LPRInDB, ClientCreate, ClientUpdate
+from client.operation import (get_lpr, get_lprs, create_lpr, update_lpr, delete_lpr, create_client,
+    get_client, get_clients, update_client, delete_client)
+from tcp_connection.manager import connection_manager
 from authentication.access_level import get_admin_or_staff_user, get_current_active_user
 from user.schemas import UserInDB
 
 
 client_router = APIRouter()
 
+
+async def reconcile_connections():
+    """
+    Applies a stored client change to the running connections. The change
+    is already committed, so a failure here is logged, not returned; the
+    sweeper catches up on its next pass.
+    """
+    try:
+        await connection_manager.reconcile()
+    except Exception as e:
+        print(f"[ERROR] Could not reconcile LPR client connections, leaving it to the sweeper: {e!r}")
+
+
 @client_router.post("/clients/", response_model=ClientInDB, dependencies=[Depends(get_admin_or_staff_user)], status_code=status.HTTP_201_CREATED)
 async def api_create_client(client: ClientCreate, db: AsyncSession = Depends(get_db)):
-    return await create_client(db, client)
+    db_client = await create_client(db, client)
+    # Connect to the new LPR server without a restart
+    await reconcile_connections()
+    return db_client
+
+@client_router.get("/clients/", response_model=List[ClientInDB], dependencies=[Depends(get_admin_or_staff_user)])
+async def api_get_clients(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
+    return await get_clients(db, skip, limit)
+
+@client_router.get("/clients/{client_id}", response_model=ClientInDB, dependencies=[Depends(get_admin_or_staff_user)])
+async def api_read_client(client_id: int, db: AsyncSession = Depends(get_db)):
+    return await get_client(db, client_id)
+
+@client_router.put("/clients/{client_id}", response_model=ClientInDB, dependencies=[Depends(get_admin_or_staff_user)])
+async def api_update_client(client_id: int, client: ClientUpdate, db: AsyncSession = Depends(get_db)):
+    db_client = await update_client(db, client_id, client)
+    # Reopens the connection only if its address, token or active flag changed
+    await reconcile_connections()
+    return db_client
+
+@client_router.delete("/clients/{client_id}", response_model=ClientInDB, dependencies=[Depends(get_admin_or_staff_user)])
+async def api_delete_client(client_id: int, db: AsyncSession = Depends(get_db)):
+    db_client = await delete_client(db, client_id)
+    await reconcile_connections()
+    return db_client
 
 
 lpr_router = APIRouter()
@@ -15,6 +15,14 @@ class ClientCreate(ClientBase):
     lpr_id: int
     camera_ids: List[int] = []
 
+class ClientUpdate(BaseModel):
+    ip: Optional[str] = None
+    port: Optional[int] = None
+    auth_token: Optional[str] = None
+    is_active: Optional[bool] = None
+    lpr_id: Optional[int] = None
+    camera_ids: Optional[List[int]] = None
+
 
 
 class LPRBase(BaseModel):
@@ -0,0 +1,326 @@
+"""
+Monthly range partitions of plate_data and image_data on `timestamp`.
+
+New databases get partitioned tables from `create_all` (see the models'
+`postgresql_partition_by`); `PartitionMaintainer` then keeps partitions
+created ahead of time and drops whole partitions past the retention period.
+
+Tables created before partitioning are converted once, in a maintenance
+window, with:
+
+    python -m db.partitions convert
+"""
+import argparse
+import asyncio
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from settings import settings
+from db.engine import Base, engine
+
+
+PARTITIONED_TABLES = ("plate_data", "image_data")
+
+# Partition DDL waits at most this long for long readers such as exports,
+# instead of queueing the plate writer's inserts behind it; it is retried
+# on the next run
+DDL_LOCK_TIMEOUT = "5s"
+
+# Seconds before a failed maintenance run is retried, when that is sooner than the interval
+RETRY_INTERVAL = 60
+
+_BOUNDS = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+Bounds = Tuple[Optional[datetime], Optional[datetime]]
+
+
+def month_start(day: date) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    result = await conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {"table": table})
+    return result.scalar()
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> Dict[str, Optional[Bounds]]:
+    """
+    Partitions of `table` and their [from, to) bounds; None bounds for the
+    DEFAULT partition, None ends for MINVALUE/MAXVALUE.
+    """
+    result = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+    ), {"table": table})
+    partitions = {}
+    for name, bound in result.all():
+        match = _BOUNDS.search(bound)
+        partitions[name] = (_parse_bound(match.group(1)), _parse_bound(match.group(2))) if match else None
+    return partitions
+
+
+def _overlaps(bounds: Bounds, start: datetime, end: datetime) -> bool:
+    lower, upper = bounds
+    return (lower is None or lower < end) and (upper is None or upper > start)
+
+
+async def ensure_default_partition(conn: AsyncConnection, table: str) -> List[str]:
+    """
+    Creates the DEFAULT partition that catches rows outside every monthly
+    partition (e.g. from an LPR server with a wrong clock), so inserts never
+    fail for want of a partition. Returns the partition created, if any.
+    """
+    if f"{table}_default" in await list_partitions(conn, table):
+        return []
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    return [f"{table}_default"]
+
+
+async def create_month_partition(conn: AsyncConnection, table: str, start: datetime, end: datetime) -> str:
+    """
+    Creates the partition of `table` for [start, end). Postgres refuses to
+    create it while the DEFAULT partition holds rows of that range, so such
+    rows are first moved into the new table, which is then attached.
+    """
+    name = partition_name(table, start)
+    bounds = {"start": start, "end": end}
+    values = f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    stray = (await conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE timestamp >= :start AND timestamp < :end)"
+    ), bounds)).scalar()
+    if not stray:
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {values}"))
+        return name
+
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {values}"))
+    print(f"[INFO] Moved {moved.rowcount} rows of {table}_default into {name}")
+    return name
+
+
+async def ensure_partitions(conn: AsyncConnection, table: str, today: date, months_ahead: int) -> List[str]:
+    """
+    Creates the partitions from the current month to `months_ahead` months
+    ahead, skipping months an existing partition already covers. Returns
+    the partitions created.
+    """
+    existing = await list_partitions(conn, table)
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(month_start(today), offset)
+        end = add_months(start, 1)
+        if any(bounds is not None and _overlaps(bounds, start, end) for bounds in existing.values()):
+            continue
+        created.append(await create_month_partition(conn, table, start, end))
+    return created
+
+
+async def drop_expired_partitions(conn: AsyncConnection, table: str, cutoff: datetime) -> List[str]:
+    """
+    Drops every partition whose rows are all older than `cutoff`.
+    Returns the partitions dropped.
+    """
+    dropped = []
+    for name, bounds in (await list_partitions(conn, table)).items():
+        if bounds is None or bounds[1] is None or bounds[1] > cutoff:
+            continue
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+class PartitionMaintainer:
+    """
+    Keeps partitions created ahead of time and, with a retention period,
+    drops the expired ones; at startup and then every `interval` seconds.
+    Tables that are not partitioned (yet) are left alone.
+    """
+
+    def __init__(self, months_ahead: int = settings.DB_PARTITION_MONTHS_AHEAD,
+                 retention_months: int = settings.PLATE_RETENTION_MONTHS,
+                 interval: float = settings.DB_PARTITION_MAINTENANCE_INTERVAL):
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        self.last_run: Optional[datetime] = None
+        self.created: List[str] = []
+        self.dropped: List[str] = []
+        self.unpartitioned: List[str] = []
+        self.errors = 0
+        self.failing = False
+
+    async def run_once(self):
+        """
+        Maintains each table in its own transactions, so a failure on one
+        (logged and counted) leaves the others maintained; the default
+        partition is committed first, so inserts work whatever fails after.
+        """
+        today = date.today()
+        unpartitioned = []
+        errors = self.errors
+        for table in PARTITIONED_TABLES:
+            try:
+                async with engine.begin() as conn:
+                    if not await is_partitioned(conn, table):
+                        unpartitioned.append(table)
+                        continue
+                    await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+                    self.created += await ensure_default_partition(conn, table)
+                async with engine.begin() as conn:
+                    await conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+                    self.created += await ensure_partitions(conn, table, today, self.months_ahead)
+                    if self.retention_months > 0:
+                        cutoff = add_months(month_start(today), -self.retention_months)
+                        self.dropped += await drop_expired_partitions(conn, table, cutoff)
+            except Exception as e:
+                self.errors += 1
+                print(f"[ERROR] Partition maintenance of {table} failed: {e}")
+
+        if self.retention_months > 0:
+            # Only needed to count unique plates of days still receiving rows
+            cutoff = add_months(month_start(today), -self.retention_months)
+            async with engine.begin() as conn:
+                await conn.execute(text("DELETE FROM daily_plates WHERE day < :cutoff"), {"cutoff": cutoff.date()})
+
+        if unpartitioned and unpartitioned != self.unpartitioned:
+            print(f"[INFO] {', '.join(unpartitioned)} not partitioned; run `python -m db.partitions convert` to convert")
+        self.unpartitioned = unpartitioned
+        self.failing = self.errors > errors
+        self.last_run = datetime.now()
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(self.interval, RETRY_INTERVAL) if self.failing else self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failing = True
+                print(f"[ERROR] Partition maintenance failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_run": self.last_run,
+            "created": self.created,
+            "dropped": self.dropped,
+            "unpartitioned": self.unpartitioned,
+            "errors": self.errors,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+async def convert_table(conn: AsyncConnection, table: str):
+    """
+    Turns an existing plain `table` into a partitioned one. The old table
+    becomes its `<table>_legacy` partition, covering everything up to the
+    month after its newest row, so no rows are copied; retention drops it
+    once all of it has expired. Keeps the id sequence.
+    """
+    legacy = f"{table}_legacy"
+    await conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    sequence = (await conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table})).scalar()
+    newest = (await conn.execute(text(f"SELECT max(timestamp) FROM {table}"))).scalar()
+
+    # Free the table and index names for the partitioned table
+    await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    indexes = await conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": legacy})
+    for (index,) in indexes.all():
+        await conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+    # The partitioned table's key is (id, timestamp); attaching builds it
+    await conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey_legacy"))
+
+    await conn.run_sync(Base.metadata.tables[table].create)
+    new_sequence = (await conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table})).scalar()
+    await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)"))
+    await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+    await conn.execute(text(f"DROP SEQUENCE {new_sequence}"))
+
+    upper = add_months(month_start(max(newest.date(), date.today()) if newest else date.today()), 1)
+    await conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat(sep=' ')}')"
+    ))
+    print(f"[INFO] Converted {table}; rows before {upper:%Y-%m-%d} are in {legacy}")
+
+
+async def convert(tables: List[str]):
+    import main  # noqa: F401  (registers every model for the mappers)
+    from utils.db_utils import create_indexes, upgrade_schema
+
+    for table in tables:
+        async with engine.begin() as conn:
+            if await is_partitioned(conn, table):
+                print(f"[INFO] {table} is already partitioned")
+                continue
+            # The old table needs every column of the model before it can be attached
+            await upgrade_schema(conn)
+            await convert_table(conn, table)
+    await partition_maintainer.run_once()
+    print(f"[INFO] Created partitions: {', '.join(partition_maintainer.created) or 'none'}")
+    await create_indexes(engine)
+    print("[INFO] Database indexes created")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="partition tables created before partitioning")
+    convert_parser.add_argument("--table", action="append", choices=PARTITIONED_TABLES,
+                                help="table to convert (default: all)")
+    commands.add_parser("maintain", help="create upcoming partitions and drop expired ones now")
+    args = parser.parse_args()
+
+    async def dispatch():
+        try:
+            if args.command == "convert":
+                await convert(args.table or list(PARTITIONED_TABLES))
+            else:
+                await partition_maintainer.run_once()
+                print(partition_maintainer.stats())
+        finally:
+            await engine.dispose()
+    asyncio.run(dispatch())
+
+
+if __name__ == "__main__":
+    cli()
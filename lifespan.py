@@ -1,45 +1,131 @@
 import asyncio
 import threading
-import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from twisted.internet import reactor
 from sqlalchemy.future import select
 
+from settings import settings
 from db.engine import engine, Base, async_session
-from utils.db_utils import create_default_admin
-from tcp_connection.TCPClient import connect_to_server, send_command_to_server, sio
+from db.partitions import partition_maintainer
+from utils.db_utils import create_default_admin, create_indexes, upgrade_schema
+from tcp_connection.TCPClient import send_command_to_server, sio
 from tcp_connection.router import tcp_factories, tcp_factory_lock
 from tcp_connection.manager import connection_manager
+from tcp_connection.pipeline import start_pipeline, stop_pipeline
+from tcp_connection.sharding import IngestSupervisor
 from client.models import LPR, Client
+from minio_db.minio_manager import get_minio_client
+from utils.readiness import readiness
+
+
+# Seconds between attempts while the database is unreachable at startup
+STARTUP_RETRY_DELAY = 5
 
 
 async def initialize_tcp_clients():
     """
-    Initialize a TCP client for each server and store the factory.
+    Initialize a TCP client for each active client and keep them in sync
+    with the clients table from then on.
+    """
+    if settings.INGEST_WORKERS > 0:
+        # Connections run in worker processes instead of this one
+        connection_manager.supervisor = IngestSupervisor(settings.INGEST_WORKERS)
+        connection_manager.supervisor.start()
+    try:
+        await connection_manager.reconcile()
+    except Exception as e:
+        # The sweeper retries on its next pass
+        print(f"[ERROR] Initial LPR client reconcile failed: {e}")
+        readiness.mark_failed("lpr_clients", str(e))
+    connection_manager.start_sweeper()
+
+
+async def initialize_database():
+    """
+    Creates the schema (unless DB_CREATE_TABLES is off) and the default
+    admin user, retrying until the database is reachable.
+    """
+    while True:
+        try:
+            if settings.DB_CREATE_TABLES:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    await upgrade_schema(conn)
+                print("[INFO] Database tables created")
+
+            async with async_session() as session:
+                await create_default_admin(session)
+            print("[INFO] Default admin user created")
+            break
+        except Exception as e:
+            print(f"[ERROR] Database initialization failed, retrying in {STARTUP_RETRY_DELAY}s: {e}")
+            readiness.mark_failed("database", str(e))
+            await asyncio.sleep(STARTUP_RETRY_DELAY)
+
+    # Inserts into a new partitioned table fail until it has partitions. Not
+    # retried here: failures are logged and the maintainer retries shortly
+    try:
+        await partition_maintainer.run_once()
+    except Exception as e:
+        partition_maintainer.failing = True
+        print(f"[ERROR] Partition maintenance failed: {e}")
+    partition_maintainer.start()
+    readiness.mark_ready("database")
+
+
+async def initialize_indexes():
     """
-    async with async_session() as session:
-        result = await session.execute(select(Client))
-        clients = result.unique().scalars().all()
+    Builds missing indexes on existing tables. This can take a while on
+    large tables, so it runs after the database is marked ready.
+    """
+    if not settings.DB_CREATE_TABLES:
+        return
+    try:
+        await create_indexes(engine)
+        print("[INFO] Database indexes created")
+    except Exception as e:
+        print(f"[ERROR] Could not create database indexes: {e}")
+
+
+async def initialize_minio():
+    try:
+        await asyncio.to_thread(get_minio_client)
+    except Exception:
+        # Reported through readiness; retried on first use
+        pass
+
+
+async def startup():
+    """
+    Slow startup work, run in the background so the app serves requests
+    (and GET /ready) right away. LPR clients need the clients table, so
+    they wait for the database; MinIO, if an image store uses it, comes up
+    alongside.
+    """
+    async def database_then_clients():
+        await initialize_database()
+        await initialize_tcp_clients()
+        print("[INFO] TCP clients initialized")
+        await initialize_indexes()
+
+    if "minio" in (settings.PLATE_IMAGE_STORE, settings.PROFILE_IMAGE_STORE):
+        await asyncio.gather(database_then_clients(), initialize_minio())
+    else:
+        await database_then_clients()
 
-    for client in clients:
-        factory = connect_to_server(client.ip, client.port, client.auth_token, asyncio.get_event_loop())
-        await connection_manager.add_connection(client.id, factory)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("[INFO] Starting lifespan")
-    # Initialize database tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("[INFO] Database tables created")
-
-    # Create default admin user
-    async with async_session() as session:
-        await create_default_admin(session)
-
-    print("[INFO] Default admin user created")
+    readiness.register("database")
+    readiness.register("pipeline")
+    readiness.register("lpr_clients", required=False)
+    if "minio" in (settings.PLATE_IMAGE_STORE, settings.PROFILE_IMAGE_STORE):
+        readiness.register("minio", required=False)
 
+    start_pipeline()
+    readiness.mark_ready("pipeline")
 
     # Start the Twisted reactor in a separate thread
     async def start_reactor():
@@ -67,17 +153,19 @@ async def lifespan(app: FastAPI):
 
     # Initialize connections to all servers
 
-    reactor_thread = threading.Thread(target=asyncio.run, args=(start_reactor(),),  daemon=True)
-    reactor_thread.start()
-    await initialize_tcp_clients()
-
-
-    # Allow some time for TCP clients to authenticate before FastAPI starts serving
-    time.sleep(2)
+    if settings.TCP_CLIENT_BACKEND != "asyncio" and settings.INGEST_WORKERS == 0:
+        reactor_thread = threading.Thread(target=asyncio.run, args=(start_reactor(),),  daemon=True)
+        reactor_thread.start()
+    startup_task = asyncio.create_task(startup())
 
-    print("[INFO] TCP clients initialized")
     yield
+    if not startup_task.done():
+        startup_task.cancel()
+        await asyncio.gather(startup_task, return_exceptions=True)
     # Clean up resources
+    await partition_maintainer.stop()
+    await connection_manager.close_all()
+    await stop_pipeline()
     await engine.dispose()
     # Close all TCP clients
     def stop_reactor():
@@ -1,5 +1,6 @@
 import os
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
 
@@ -12,6 +13,8 @@ from building_gate.router import building_router, gate_router
 from camera.settings_router import settings_router as camera_setting_router
 from camera.cameras_router import camera_router
 from client.router import lpr_router, client_router
+from plates.router import plate_router
+from utils.readiness import readiness
 
 app = FastAPI(lifespan=lifespan)
 
@@ -32,6 +35,16 @@ app.include_router(camera_router, tags=["Cameras"])
 app.include_router(lpr_router, tags=["LPRs"])
 app.include_router(client_router, tags=["Clients"])
 app.include_router(tcp_router, tags=["tcp"])
+app.include_router(plate_router, tags=["Plates"])
+
+
+@app.get("/ready", tags=["Health"])
+async def api_ready():
+    """
+    Per-subsystem startup state; 503 until every required subsystem is up.
+    """
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
 
 #app.mount("/", socketio.ASGIApp(sio))
 app_socket = socketio.ASGIApp(
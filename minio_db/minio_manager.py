@@ -1,8 +1,9 @@
 import os
+import threading
 from minio import Minio
-from minio.error import S3Error
 
 from settings import settings
+from utils.readiness import readiness
 
 
 # MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
@@ -11,25 +12,46 @@ from settings import settings
 # MINIO_USE_SSL = os.getenv("MINIO_USE_SSL", "False") == "True"
 # MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "user-profiles")
 
-# Initialize MinIO client
-minio_client = Minio(
-    settings.MINIO_ENDPOINT,
-    access_key=settings.MINIO_ACCESS_KEY,
-    secret_key=settings.MINIO_SECRET_KEY,
-    secure=settings.MINIO_USE_SSL
-)
-try:
-    # Attempt to list buckets
-    buckets = minio_client.list_buckets()
-    print("Connected to MinIO server successfully.")
-except Exception as e:
-    print(f"Failed to connect to MinIO server: {e}")
-
-
-# Ensure the bucket exists
-found = minio_client.bucket_exists(settings.MINIO_BUCKET_NAME)
-if not found:
-    minio_client.make_bucket(settings.MINIO_BUCKET_NAME)
-    print(f"Bucket '{settings.MINIO_BUCKET_NAME}' created.")
-else:
-    print(f"Bucket '{settings.MINIO_BUCKET_NAME}' already exists.")
+_minio_client = None
+_minio_lock = threading.Lock()
+
+
+def get_minio_client() -> Minio:
+    """
+    Returns the MinIO client, connecting and ensuring the bucket exists on
+    first use. Blocking; call it from a thread in async code. A failed
+    attempt raises and is retried on the next call, so a MinIO outage no
+    longer stops the app from starting.
+    """
+    global _minio_client
+    if _minio_client is not None:
+        return _minio_client
+
+    with _minio_lock:
+        if _minio_client is not None:
+            return _minio_client
+
+        # Initialize MinIO client
+        client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_USE_SSL
+        )
+        try:
+            # Ensure the bucket exists
+            found = client.bucket_exists(settings.MINIO_BUCKET_NAME)
+            if not found:
+                client.make_bucket(settings.MINIO_BUCKET_NAME)
+                print(f"Bucket '{settings.MINIO_BUCKET_NAME}' created.")
+            else:
+                print(f"Bucket '{settings.MINIO_BUCKET_NAME}' already exists.")
+        except Exception as e:
+            print(f"Failed to connect to MinIO server: {e}")
+            readiness.mark_failed("minio", str(e))
+            raise
+
+        print("Connected to MinIO server successfully.")
+        readiness.mark_ready("minio")
+        _minio_client = client
+        return _minio_client
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from settings import settings
+from db.engine import engine
+from client.models import ImageData, PlateData
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+CSV = "csv"
+NDJSON = "ndjson"
+EXPORT_FORMATS = (CSV, NDJSON)
+MEDIA_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+EXPORT_COLUMNS = ("id", "timestamp", "plate_number", "ocr_accuracy", "vision_speed", "gate", "hits",
+                  "scene_image_key", "plate_image_keys")
+
+
+def export_query(plate_number: Optional[str] = None, gate: Optional[str] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 min_accuracy: Optional[float] = None):
+    """
+    Plate rows matching the filters, oldest first, each with the image store
+    keys of its plate crops. The crops are looked up per row on the image
+    index, so rows stream out in index order without a sort or hash join.
+    """
+    image_keys = (
+        select(func.array_agg(ImageData.file_path))
+        .where(ImageData.plate_number == PlateData.plate_number,
+               ImageData.gate == PlateData.gate,
+               ImageData.timestamp == PlateData.timestamp)
+        .scalar_subquery()
+        .label("plate_image_keys")
+    )
+    query = select(*(PlateData.__table__.c[column] for column in EXPORT_COLUMNS[:-1]), image_keys)
+    if plate_number:
+        query = query.where(PlateData.plate_number == plate_number)
+    if gate:
+        query = query.where(PlateData.gate == gate)
+    if start:
+        query = query.where(PlateData.timestamp >= start)
+    if end:
+        query = query.where(PlateData.timestamp < end)
+    if min_accuracy is not None:
+        query = query.where(PlateData.ocr_accuracy >= min_accuracy)
+    return query.order_by(PlateData.timestamp, PlateData.id)
+
+
+def _csv_chunk(rows: List[Dict[str, Any]], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            row["timestamp"].isoformat() if column == "timestamp"
+            else ";".join(row[column] or ()) if column == "plate_image_keys"
+            else row[column]
+            for column in EXPORT_COLUMNS
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_chunk(rows: List[Dict[str, Any]]) -> bytes:
+    for row in rows:
+        row["plate_image_keys"] = row["plate_image_keys"] or []
+    if orjson is not None:
+        return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+    return "".join(json.dumps(row, default=datetime.isoformat) + "\n" for row in rows).encode("utf-8")
+
+
+async def stream_export(query, format: str = CSV, compress: bool = False,
+                        batch_size: int = settings.PLATE_EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    Encodes the rows of `query` as CSV or NDJSON, optionally gzipped, one
+    chunk per `batch_size` rows.
+
+    Rows are fetched through a server-side cursor on a connection of its
+    own, so memory stays bounded by the batch size however long the export
+    is. The export reads one snapshot: rows the plate writer inserts
+    meanwhile are not in it, and it takes no lock that ingest waits on.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async with engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=batch_size))
+        header = True
+        async for partition in result.mappings().partitions():
+            rows = [dict(row) for row in partition]
+            chunk = _csv_chunk(rows, header) if format == CSV else _ndjson_chunk(rows)
+            header = False
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if format == CSV and header:
+            # No rows: still a valid CSV file
+            chunk = _csv_chunk([], header)
+            yield compressor.compress(chunk) if compressor is not None else chunk
+    if compressor is not None:
+        yield compressor.flush()
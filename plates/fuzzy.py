@@ -0,0 +1,111 @@
+from typing import Any, Dict, FrozenSet, List
+
+from sqlalchemy import and_, case, delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from client.models import KnownPlate, PlateData
+from tcp_connection.debounce import normalise_plate
+
+
+# Cost of substituting characters the recognizer commonly mixes up; any
+# other substitution, insertion or deletion costs 1
+CONFUSION_WEIGHTS: Dict[FrozenSet[str], float] = {
+    frozenset(pair): weight
+    for pair, weight in (
+        ("0O", 0.2), ("0D", 0.4), ("0Q", 0.4), ("OD", 0.4), ("OQ", 0.4),
+        ("1I", 0.2), ("1L", 0.4), ("1T", 0.5), ("17", 0.5),
+        ("2Z", 0.3), ("5S", 0.3), ("6G", 0.4), ("8B", 0.3), ("38", 0.5),
+        ("4A", 0.5), ("9G", 0.5), ("UV", 0.4), ("MN", 0.5), ("HN", 0.5),
+    )
+}
+
+
+def substitution_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    return CONFUSION_WEIGHTS.get(frozenset((a, b)), 1.0)
+
+
+def weighted_distance(a: str, b: str) -> float:
+    """
+    Levenshtein distance between two normalised plates where substituting
+    a commonly confused pair (0/O, 8/B, ...) costs less than 1.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + substitution_cost(char_a, char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def plate_key(column):
+    """
+    SQL for a plate number reduced to upper-case letters and digits, the
+    same reduction as `normalise_plate`. Its arguments are inlined rather
+    than bound so that GROUP BY on it matches the selected expression.
+    """
+    return func.upper(func.regexp_replace(
+        column, literal_column("'[^[:alnum:]]'"), literal_column("''"), literal_column("'g'")
+    ))
+
+
+async def update_known_plates(session: AsyncSession, plates: List[Dict[str, Any]]):
+    """
+    Adds a batch of new plate rows to known_plates; part of the caller's
+    transaction. Rows go in plate_key order so that concurrent writers lock
+    them in the same order and cannot deadlock.
+    """
+    known: Dict[str, Dict[str, Any]] = {}
+    for row in plates:
+        key = normalise_plate(row.get("plate_number"))
+        if not key:
+            continue
+        plate = known.get(key)
+        if plate is None:
+            known[key] = {"plate_key": key, "plate_number": row["plate_number"], "first_seen": row["timestamp"],
+                          "last_seen": row["timestamp"], "sightings": 1}
+            continue
+        plate["sightings"] += 1
+        plate["first_seen"] = min(plate["first_seen"], row["timestamp"])
+        if row["timestamp"] >= plate["last_seen"]:
+            plate["last_seen"] = row["timestamp"]
+            plate["plate_number"] = row["plate_number"]
+    if not known:
+        return
+
+    statement = insert(KnownPlate).values([known[key] for key in sorted(known)])
+    newer = statement.excluded.last_seen >= KnownPlate.last_seen
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=[KnownPlate.plate_key],
+        set_={
+            "plate_number": case((newer, statement.excluded.plate_number), else_=KnownPlate.plate_number),
+            "first_seen": func.least(KnownPlate.first_seen, statement.excluded.first_seen),
+            "last_seen": func.greatest(KnownPlate.last_seen, statement.excluded.last_seen),
+            "sightings": KnownPlate.sightings + statement.excluded.sightings,
+        },
+    ))
+
+
+async def rebuild_known_plates(conn: AsyncConnection):
+    """
+    Recomputes known_plates from all of plate_data, e.g. for history
+    recorded before the table existed. The plate writer waits meanwhile.
+    """
+    await conn.execute(text("LOCK TABLE known_plates IN EXCLUSIVE MODE"))
+    await conn.execute(delete(KnownPlate))
+    key = plate_key(PlateData.plate_number)
+    await conn.execute(insert(KnownPlate).from_select(
+        ["plate_key", "plate_number", "first_seen", "last_seen", "sightings"],
+        select(
+            key,
+            func.array_agg(aggregate_order_by(PlateData.plate_number, PlateData.timestamp.desc()))[1],
+            func.min(PlateData.timestamp), func.max(PlateData.timestamp), func.count(),
+        ).where(and_(PlateData.plate_number != "Unknown", key != "")).group_by(key),
+    ))
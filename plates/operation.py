@@ -0,0 +1,214 @@
+import base64
+import binascii
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from client.models import DailyPlate, GateDailyTraffic, GateHourlyTraffic, ImageData, KnownPlate, PlateData
+from plates.fuzzy import weighted_distance
+from plates.rollups import ALL_GATES
+from plates.schemas import DailyTraffic, HourlyTraffic, PlateCandidate, PlateDataInDB, PlateSearchPage
+from tcp_connection.debounce import normalise_plate
+
+
+# Plates the trigram index hands over for re-ranking by edit distance
+FUZZY_CANDIDATES = 200
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """
+    Opaque keyset cursor: the (timestamp, id) of the last row of a page.
+    """
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def get_plate_image_keys(db: AsyncSession, rows: List[PlateData]) -> Dict[Tuple, List[str]]:
+    """
+    Image store keys of the plate crops of `rows`, by (plate_number, gate, timestamp).
+    """
+    if not rows:
+        return {}
+    result = await db.execute(
+        select(ImageData.plate_number, ImageData.gate, ImageData.timestamp, ImageData.file_path)
+        .where(tuple_(ImageData.plate_number, ImageData.gate, ImageData.timestamp).in_(
+            [(row.plate_number, row.gate, row.timestamp) for row in rows]
+        ))
+        # Limits the lookup to the partitions the page spans
+        .where(ImageData.timestamp.between(min(row.timestamp for row in rows), max(row.timestamp for row in rows)))
+    )
+    keys: Dict[Tuple, List[str]] = {}
+    for plate_number, gate, timestamp, file_path in result.all():
+        keys.setdefault((plate_number, gate, timestamp), []).append(file_path)
+    return keys
+
+
+async def search_plates(db: AsyncSession, plate_number: Optional[str] = None, gate: Optional[str] = None,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        min_accuracy: Optional[float] = None, cursor: Optional[str] = None,
+                        limit: int = 50) -> PlateSearchPage:
+    """
+    Plate rows matching the filters, newest first, one page at a time.
+
+    Pages are keyset-paginated on (timestamp, id): the cursor carries the
+    last row of the previous page, so every page is an index range scan
+    (on the plate, gate or timestamp index) however deep it is.
+    """
+    query = select(PlateData)
+    if plate_number:
+        query = query.where(PlateData.plate_number == plate_number)
+    if gate:
+        query = query.where(PlateData.gate == gate)
+    if start:
+        query = query.where(PlateData.timestamp >= start)
+    if end:
+        query = query.where(PlateData.timestamp < end)
+    if min_accuracy is not None:
+        query = query.where(PlateData.ocr_accuracy >= min_accuracy)
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        # The plain bound lets Postgres skip newer partitions; the row comparison alone would not
+        query = query.where(PlateData.timestamp <= cursor_timestamp,
+                            tuple_(PlateData.timestamp, PlateData.id) < tuple_(cursor_timestamp, cursor_id))
+
+    # One row more than asked tells whether there is a next page
+    query = query.order_by(PlateData.timestamp.desc(), PlateData.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    image_keys = await get_plate_image_keys(db, rows)
+    items = []
+    for row in rows:
+        item = PlateDataInDB.model_validate(row)
+        item.plate_image_keys = image_keys.get((row.plate_number, row.gate, row.timestamp), [])
+        items.append(item)
+
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    return PlateSearchPage(items=items, next_cursor=next_cursor)
+
+
+async def fuzzy_search_plates(db: AsyncSession, plate_number: str, gate: Optional[str] = None,
+                              start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              max_distance: float = 2.0, min_similarity: float = 0.3,
+                              limit: int = 20) -> List[PlateCandidate]:
+    """
+    Plates that may be `plate_number` misread by the recognizer.
+
+    The trigram index on known_plates narrows the distinct plates down to
+    the FUZZY_CANDIDATES most similar ones; those are ranked by
+    confusion-weighted edit distance and kept up to `max_distance`. Gate
+    and period filters keep plates seen there on the days [start, end)
+    touches (daily_plates); sightings and last_seen are over the whole
+    history.
+    """
+    query_key = normalise_plate(plate_number)
+    if not query_key:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Plate number has no letters or digits")
+
+    similarity = func.similarity(KnownPlate.plate_key, query_key)
+    query = (
+        select(KnownPlate.plate_key, KnownPlate.plate_number, KnownPlate.sightings, KnownPlate.last_seen, similarity)
+        # `%` is the index-backed form of similarity >= pg_trgm.similarity_threshold
+        .where(KnownPlate.plate_key.op("%")(query_key))
+        .order_by(similarity.desc())
+        .limit(FUZZY_CANDIDATES)
+    )
+    if gate or start or end:
+        seen = select(DailyPlate.plate_key).where(
+            DailyPlate.plate_key == KnownPlate.plate_key,
+            DailyPlate.gate == (gate or ALL_GATES),
+        )
+        if start:
+            seen = seen.where(DailyPlate.day >= start.date())
+        if end:
+            # Exclusive like `search_plates`: a midnight `end` leaves its day out, any later time takes it in
+            last_day = end.date() if end.time() == time.min else end.date() + timedelta(days=1)
+            seen = seen.where(DailyPlate.day < last_day)
+        query = query.where(seen.exists())
+
+    try:
+        await db.execute(select(func.set_config("pg_trgm.similarity_threshold", str(min_similarity), True)))
+        rows = (await db.execute(query)).all()
+    except ProgrammingError as e:
+        await db.rollback()
+        print(f"[ERROR] Fuzzy plate search failed: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Fuzzy search needs the pg_trgm extension")
+
+    candidates = []
+    for candidate_key, reading, sightings, last_seen, candidate_similarity in rows:
+        distance = weighted_distance(query_key, candidate_key)
+        if distance <= max_distance:
+            candidates.append(PlateCandidate(
+                plate_key=candidate_key, plate_number=reading, distance=round(distance, 2),
+                similarity=round(candidate_similarity, 3), sightings=sightings, last_seen=last_seen,
+            ))
+    # Closest first; among equally close plates, the more similar and more often seen
+    candidates.sort(key=lambda c: (c.distance, -c.similarity, -c.sightings))
+    return candidates[:limit]
+
+
+async def get_hourly_traffic(db: AsyncSession, start: datetime, end: datetime,
+                             gate: Optional[str] = None) -> List[HourlyTraffic]:
+    query = (
+        select(GateHourlyTraffic)
+        .where(GateHourlyTraffic.hour >= start, GateHourlyTraffic.hour < end)
+        .order_by(GateHourlyTraffic.hour, GateHourlyTraffic.gate)
+    )
+    if gate is not None:
+        query = query.where(GateHourlyTraffic.gate == gate)
+    return [
+        HourlyTraffic(
+            gate=row.gate, hour=row.hour, vehicles=row.vehicles, sightings=row.sightings,
+            avg_ocr_accuracy=row.ocr_accuracy_sum / row.ocr_accuracy_count if row.ocr_accuracy_count else None,
+            avg_vision_speed=row.vision_speed_sum / row.vision_speed_count if row.vision_speed_count else None,
+        )
+        for row in (await db.execute(query)).scalars().all()
+    ]
+
+
+async def get_daily_traffic(db: AsyncSession, start: date, end: date,
+                            gate: Optional[str] = None) -> List[DailyTraffic]:
+    """
+    Unique plates and vehicles per gate and day in [start, end); gate '*'
+    for all gates together.
+    """
+    day = func.date(GateHourlyTraffic.hour)
+    vehicles_query = (
+        select(GateHourlyTraffic.gate, day, func.sum(GateHourlyTraffic.vehicles))
+        .where(GateHourlyTraffic.hour >= start, GateHourlyTraffic.hour < end)
+        .group_by(GateHourlyTraffic.gate, day)
+    )
+    unique_query = (
+        select(GateDailyTraffic)
+        .where(GateDailyTraffic.day >= start, GateDailyTraffic.day < end)
+        .order_by(GateDailyTraffic.day, GateDailyTraffic.gate)
+    )
+    if gate is not None:
+        if gate != ALL_GATES:
+            vehicles_query = vehicles_query.where(GateHourlyTraffic.gate == gate)
+        unique_query = unique_query.where(GateDailyTraffic.gate == gate)
+
+    vehicles: Dict[Tuple[str, date], int] = {}
+    for row_gate, row_day, count in (await db.execute(vehicles_query)).all():
+        vehicles[(row_gate, row_day)] = count
+        vehicles[(ALL_GATES, row_day)] = vehicles.get((ALL_GATES, row_day), 0) + count
+
+    return [
+        DailyTraffic(gate=row.gate, day=row.day, unique_plates=row.unique_plates,
+                     vehicles=vehicles.get((row.gate, row.day), 0))
+        for row in (await db.execute(unique_query)).scalars().all()
+    ]
@@ -0,0 +1,188 @@
+"""
+Per-gate traffic rollups: vehicles and sightings per hour with OCR
+accuracy and speed averages, and unique plates per day.
+
+The plate writer applies `update_rollups` to every batch it inserts, in the
+same transaction, so rollups always match the raw rows (spool replays
+included). `backfill` rebuilds them from plate_data, and `known-plates`
+rebuilds the distinct plates fuzzy search matches against:
+
+    python -m plates.rollups backfill [--since 2024-01-01] [--until 2024-02-01]
+    python -m plates.rollups known-plates
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from client.models import DailyPlate, GateDailyTraffic, GateHourlyTraffic, PlateData
+from plates.fuzzy import plate_key, rebuild_known_plates
+from tcp_connection.debounce import normalise_plate
+
+
+ALL_GATES = "*"
+
+_HOURLY_SUMS = ("vehicles", "sightings", "ocr_accuracy_sum", "ocr_accuracy_count",
+                "vision_speed_sum", "vision_speed_count")
+
+
+def hourly_deltas(plates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Folds plate rows into one increment per (gate, hour), ordered by
+    (gate, hour).
+    """
+    deltas: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    for row in plates:
+        gate = row.get("gate") or ""
+        hour = row["timestamp"].replace(minute=0, second=0, microsecond=0)
+        delta = deltas.get((gate, hour))
+        if delta is None:
+            delta = deltas[(gate, hour)] = {"gate": gate, "hour": hour, **{column: 0 for column in _HOURLY_SUMS}}
+        delta["vehicles"] += 1
+        delta["sightings"] += row.get("hits", 1)
+        if row.get("ocr_accuracy") is not None:
+            delta["ocr_accuracy_sum"] += row["ocr_accuracy"]
+            delta["ocr_accuracy_count"] += 1
+        if row.get("vision_speed") is not None:
+            delta["vision_speed_sum"] += row["vision_speed"]
+            delta["vision_speed_count"] += 1
+    return [deltas[key] for key in sorted(deltas)]
+
+
+def daily_plates(plates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The (day, gate, plate) triples of plate rows, each also under ALL_GATES,
+    in that order. Unreadable plates are left out of unique counts.
+    """
+    seen = set()
+    for row in plates:
+        key = normalise_plate(row.get("plate_number"))
+        if not key:
+            continue
+        day = row["timestamp"].date()
+        seen.add((day, row.get("gate") or "", key))
+        seen.add((day, ALL_GATES, key))
+    return [{"day": day, "gate": gate, "plate_key": key} for day, gate, key in sorted(seen)]
+
+
+async def update_rollups(session: AsyncSession, plates: List[Dict[str, Any]]):
+    """
+    Adds a batch of new plate rows to the rollups; part of the caller's
+    transaction.
+
+    The writer, the spool replayer and every ingest worker upsert the same
+    hot rows concurrently, so rows are always locked in key order; two
+    batches locking them in arrival order could deadlock.
+    """
+    if not plates:
+        return
+
+    hourly = insert(GateHourlyTraffic).values(hourly_deltas(plates))
+    await session.execute(hourly.on_conflict_do_update(
+        index_elements=[GateHourlyTraffic.gate, GateHourlyTraffic.hour],
+        set_={column: getattr(GateHourlyTraffic, column) + getattr(hourly.excluded, column) for column in _HOURLY_SUMS},
+    ))
+
+    plates_of_day = daily_plates(plates)
+    if not plates_of_day:
+        return
+    # Only plates not yet seen that day at that gate add to its unique count
+    new_plates = (
+        insert(DailyPlate).values(plates_of_day).on_conflict_do_nothing()
+        .returning(DailyPlate.day, DailyPlate.gate)
+        .cte("new_plates")
+    )
+    daily = insert(GateDailyTraffic).from_select(
+        ["gate", "day", "unique_plates"],
+        select(new_plates.c.gate, new_plates.c.day, func.count())
+        .group_by(new_plates.c.gate, new_plates.c.day)
+        .order_by(new_plates.c.gate, new_plates.c.day),
+    )
+    await session.execute(daily.on_conflict_do_update(
+        index_elements=[GateDailyTraffic.gate, GateDailyTraffic.day],
+        set_={"unique_plates": GateDailyTraffic.unique_plates + daily.excluded.unique_plates},
+    ))
+
+
+async def backfill(conn: AsyncConnection, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Recomputes the rollups of whole days in [since, until) from plate_data.
+    Locks the rollup tables so the plate writer waits instead of adding to
+    counts that are being rebuilt; rows it is inserting meanwhile are not
+    visible here and are added once the lock is released.
+    """
+    await conn.execute(text("LOCK TABLE gate_hourly_traffic, gate_daily_traffic, daily_plates IN EXCLUSIVE MODE"))
+    if since is None:
+        since = (await conn.execute(select(func.min(PlateData.timestamp)))).scalar()
+        if since is None:
+            return
+    until = until or datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    since = datetime.combine(since.date(), datetime.min.time())
+
+    in_range = and_(PlateData.timestamp >= since, PlateData.timestamp < until)
+    # Inlined so that GROUP BY matches the selected expressions
+    gate = func.coalesce(PlateData.gate, literal_column("''"))
+    hour = func.date_trunc(literal_column("'hour'"), PlateData.timestamp)
+    day = func.date(PlateData.timestamp)
+    key = plate_key(PlateData.plate_number)
+    readable = and_(PlateData.plate_number != "Unknown", key != "")
+
+    await conn.execute(delete(GateHourlyTraffic).where(GateHourlyTraffic.hour >= since, GateHourlyTraffic.hour < until))
+    await conn.execute(delete(GateDailyTraffic).where(GateDailyTraffic.day >= since.date(), GateDailyTraffic.day < until.date()))
+    await conn.execute(delete(DailyPlate).where(DailyPlate.day >= since.date(), DailyPlate.day < until.date()))
+
+    await conn.execute(insert(GateHourlyTraffic).from_select(
+        ["gate", "hour", *_HOURLY_SUMS],
+        select(
+            gate, hour, func.count(), func.sum(PlateData.hits),
+            func.coalesce(func.sum(PlateData.ocr_accuracy), 0), func.count(PlateData.ocr_accuracy),
+            func.coalesce(func.sum(PlateData.vision_speed), 0), func.count(PlateData.vision_speed),
+        ).where(in_range).group_by(gate, hour),
+    ))
+    per_gate = select(day, gate, key).where(in_range, readable)
+    any_gate = select(day, literal_column(f"'{ALL_GATES}'"), key).where(in_range, readable)
+    await conn.execute(insert(DailyPlate).from_select(
+        ["day", "gate", "plate_key"], per_gate.union(any_gate),
+    ))
+    await conn.execute(insert(GateDailyTraffic).from_select(
+        ["gate", "day", "unique_plates"],
+        select(DailyPlate.gate, DailyPlate.day, func.count())
+        .where(DailyPlate.day >= since.date(), DailyPlate.day < until.date())
+        .group_by(DailyPlate.gate, DailyPlate.day),
+    ))
+    print(f"[INFO] Rebuilt traffic rollups from {since:%Y-%m-%d} to {until:%Y-%m-%d}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="rebuild the rollups from plate_data")
+    backfill_parser.add_argument("--since", type=datetime.fromisoformat, help="first day (default: oldest row)")
+    backfill_parser.add_argument("--until", type=datetime.fromisoformat, help="day after the last one (default: tomorrow)")
+    commands.add_parser("known-plates", help="rebuild known_plates from plate_data")
+    args = parser.parse_args()
+
+    import main  # noqa: F401  (registers every model for the mappers)
+    from db.engine import Base, engine
+
+    async def dispatch():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with engine.begin() as conn:
+                if args.command == "backfill":
+                    await backfill(conn, args.since, args.until)
+                else:
+                    await rebuild_known_plates(conn)
+                    print("[INFO] Rebuilt known plates")
+        finally:
+            await engine.dispose()
+    asyncio.run(dispatch())
+
+
+if __name__ == "__main__":
+    cli()
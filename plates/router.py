@@ -0,0 +1,102 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.engine import get_db
+from plates.schemas import DailyTraffic, HourlyTraffic, PlateCandidate, PlateSearchPage
+from plates.operation import fuzzy_search_plates, get_daily_traffic, get_hourly_traffic, search_plates
+from plates.export import CSV, EXPORT_FORMATS, MEDIA_TYPES, export_query, stream_export
+from authentication.access_level import get_current_active_user
+
+
+plate_router = APIRouter()
+
+MAX_HOURLY_RANGE = timedelta(days=93)
+
+
+@plate_router.get("/plates/search", response_model=PlateSearchPage, dependencies=[Depends(get_current_active_user)])
+async def api_search_plates(plate_number: Optional[str] = None,
+                            gate: Optional[str] = None,
+                            start: Optional[datetime] = None,
+                            end: Optional[datetime] = None,
+                            min_accuracy: Optional[float] = None,
+                            cursor: Optional[str] = None,
+                            limit: int = Query(50, ge=1, le=500),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Plate history, newest first. Pass the returned `next_cursor` back as
+    `cursor` for the next page.
+    """
+    return await search_plates(db, plate_number, gate, start, end, min_accuracy, cursor, limit)
+
+
+@plate_router.get("/plates/fuzzy", response_model=List[PlateCandidate], dependencies=[Depends(get_current_active_user)])
+async def api_fuzzy_search_plates(plate_number: str,
+                                  gate: Optional[str] = None,
+                                  start: Optional[datetime] = None,
+                                  end: Optional[datetime] = None,
+                                  max_distance: float = Query(2.0, ge=0, le=4),
+                                  min_similarity: float = Query(0.3, gt=0, le=1),
+                                  limit: int = Query(20, ge=1, le=100),
+                                  db: AsyncSession = Depends(get_db)):
+    """
+    Plates within `max_distance` OCR errors of `plate_number`, closest first.
+    Misreads of commonly confused characters (0/O, 8/B, ...) count as less
+    than a full error. `gate`, `start` and `end` keep plates seen at that
+    gate on the days from `start` up to `end` (exclusive); the period is
+    matched by whole days, so partial days count in full.
+    """
+    return await fuzzy_search_plates(db, plate_number, gate, start, end, max_distance, min_similarity, limit)
+
+
+@plate_router.get("/plates/export", response_class=StreamingResponse, dependencies=[Depends(get_current_active_user)])
+async def api_export_plates(plate_number: Optional[str] = None,
+                            gate: Optional[str] = None,
+                            start: Optional[datetime] = None,
+                            end: Optional[datetime] = None,
+                            min_accuracy: Optional[float] = None,
+                            format: str = Query(CSV, pattern=f"^({'|'.join(EXPORT_FORMATS)})$"),
+                            gzip: bool = False):
+    """
+    Plate history with the keys of its plate crops, oldest first, streamed
+    as CSV or NDJSON (optionally gzipped) whatever its size.
+    """
+    if start and end and start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    query = export_query(plate_number, gate, start, end, min_accuracy)
+    filename = f"plates.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(query, format, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@plate_router.get("/plates/traffic/hourly", response_model=List[HourlyTraffic], dependencies=[Depends(get_current_active_user)])
+async def api_hourly_traffic(start: datetime,
+                             end: datetime,
+                             gate: Optional[str] = None,
+                             db: AsyncSession = Depends(get_db)):
+    """
+    Vehicles, sightings and average OCR accuracy and speed per gate and hour
+    in [start, end).
+    """
+    if end - start > MAX_HOURLY_RANGE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {MAX_HOURLY_RANGE.days} days of hourly traffic per request")
+    return await get_hourly_traffic(db, start, end, gate)
+
+
+@plate_router.get("/plates/traffic/daily", response_model=List[DailyTraffic], dependencies=[Depends(get_current_active_user)])
+async def api_daily_traffic(start: date,
+                            end: date,
+                            gate: Optional[str] = None,
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Vehicles and unique plates per gate and day in [start, end); gate `*`
+    counts plates seen at any gate.
+    """
+    return await get_daily_traffic(db, start, end, gate)
@@ -0,0 +1,57 @@
+from datetime import date, datetime
+from pydantic import BaseModel
+from typing import Optional, List
+
+
+class PlateDataInDB(BaseModel):
+    id: int
+    timestamp: datetime
+    plate_number: str
+    ocr_accuracy: Optional[float] = None
+    vision_speed: Optional[float] = None
+    gate: Optional[str] = None
+    hits: int
+    scene_image_key: Optional[str] = None
+    # Image store keys of the plate crops saved with this row
+    plate_image_keys: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+
+class PlateSearchPage(BaseModel):
+    items: List[PlateDataInDB]
+    # Pass as `cursor` to get the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class PlateCandidate(BaseModel):
+    # Normalised plate (upper-case letters and digits)
+    plate_key: str
+    # Most recent raw reading of this plate
+    plate_number: str
+    # Confusion-weighted edit distance to the query
+    distance: float
+    similarity: float
+    # Over the whole history, whatever the gate and period filters
+    sightings: int
+    last_seen: datetime
+
+
+class HourlyTraffic(BaseModel):
+    # '' for plates read without a gate
+    gate: str
+    hour: datetime
+    vehicles: int
+    # Readings, counting the ones the debouncer merged into one vehicle
+    sightings: int
+    avg_ocr_accuracy: Optional[float] = None
+    avg_vision_speed: Optional[float] = None
+
+
+class DailyTraffic(BaseModel):
+    # '*' for all gates together
+    gate: str
+    day: date
+    vehicles: int
+    unique_plates: int
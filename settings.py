@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     POSTGRES_USER: str | Any=None
@@ -7,6 +7,15 @@ class Settings(BaseSettings):
     POSTGRES_DB: str | Any=None
     POSTGRES_HOST: str | Any=None
     POSTGRES_PORT: int=28685
+    # plate_data/image_data monthly partitions: created this many months ahead,
+    # checked every MAINTENANCE_INTERVAL seconds
+    DB_PARTITION_MONTHS_AHEAD: int=2
+    DB_PARTITION_MAINTENANCE_INTERVAL: float=6 * 3600
+    # Months of plate/image rows kept; older partitions are dropped. 0 keeps everything
+    PLATE_RETENTION_MONTHS: int=0
+    # Create missing tables and apply SCHEMA_UPGRADES at startup; turn off once
+    # the schema is managed outside the app
+    DB_CREATE_TABLES: bool=True
     SECRET_KEY: str | Any=None
     ACCESS_TOKEN_EXPIRE_MINUTES: int=10
     ALGORITHM: str | Any=None
@@ -20,6 +29,70 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: Optional[str] = None
     MINIO_USE_SSL: bool=True
     MINIO_BUCKET_NAME: str
+    # Bucket of plate and scene images when PLATE_IMAGE_STORE is "minio";
+    # MINIO_BUCKET_NAME holds the profile images
+    MINIO_PLATE_BUCKET_NAME: str="plate-images"
+    # LPR client transport: "twisted" (reactor thread) or "asyncio" (uvicorn loop)
+    TCP_CLIENT_BACKEND: str="twisted"
+    # Largest newline-delimited LPR message accepted before it is dropped
+    TCP_MAX_FRAME_SIZE: int=16 * 1024 * 1024
+    # Reconnect backoff in seconds: the delay grows by FACTOR per failed attempt
+    # up to MAX_DELAY, randomised by JITTER (a fraction of the delay)
+    TCP_RECONNECT_INITIAL_DELAY: float=1
+    TCP_RECONNECT_MAX_DELAY: float=60
+    TCP_RECONNECT_FACTOR: float=2
+    TCP_RECONNECT_JITTER: float=0.2
+    # Drop a connection that has sent nothing for this many seconds; 0 disables it.
+    # The LPR server sends no heartbeat, so only enable it for gates that are never quiet that long
+    TCP_IDLE_TIMEOUT: float=0
+    # Seconds between sweeps that sync LPR connections with the clients table; 0 disables it
+    TCP_RECONCILE_INTERVAL: float=30
+    # Seconds /send-command waits for the LPR server to answer a command
+    TCP_COMMAND_TIMEOUT: float=10
+    # Batched PlateData/ImageData writer: flush at this many rows or after this long
+    PLATE_WRITER_BATCH_SIZE: int=500
+    PLATE_WRITER_LINGER_MS: int=200
+    PLATE_WRITER_QUEUE_SIZE: int=10000
+    # Rows the database cannot take right now are spooled here and replayed
+    # once it recovers; empty disables the spool (such rows are dropped)
+    PLATE_SPOOL_DIR: str="spool"
+    PLATE_SPOOL_SEGMENT_BYTES: int=8 * 1024 * 1024
+    PLATE_SPOOL_REPLAY_INTERVAL: float=5
+    # Rows fetched from the export cursor and encoded per response chunk
+    PLATE_EXPORT_BATCH_SIZE: int=2000
+    # Threads that decode and write plate crops off the event loop
+    IMAGE_WRITE_WORKERS: int=4
+    # Image store backend per kind of image: "local", "minio" or "memory" (tests).
+    # Use "minio" for plate images when several API nodes must share them
+    PLATE_IMAGE_STORE: str="local"
+    PROFILE_IMAGE_STORE: str="minio"
+    # "local" keys are paths under this directory
+    IMAGE_STORE_LOCAL_DIR: str="."
+    # "minio" uploads larger than this are sent as multipart uploads
+    IMAGE_STORE_PART_SIZE: int=8 * 1024 * 1024
+    # Scene (full_image) persistence: "off", "all", "every:<N>", "watchlist" or
+    # "low_confidence:<ocr_accuracy>", with per-gate overrides ({"gate_1": "every:10"})
+    SCENE_IMAGE_POLICY: str="off"
+    SCENE_IMAGE_GATE_POLICIES: Dict[str, str]={}
+    SCENE_IMAGE_WATCHLIST: List[str]=[]
+    # JPEG quality kept scene images are recompressed to (needs Pillow)
+    SCENE_IMAGE_QUALITY: int=60
+    # Bounded queues between TCP ingest and its consumers.
+    # plates_data: "block" stalls the LPR connection, "spill" overflows to INGEST_SPILL_DIR
+    INGEST_PLATES_QUEUE_SIZE: int=1000
+    INGEST_PLATES_POLICY: str="block"
+    INGEST_LIVE_QUEUE_SIZE: int=50
+    INGEST_SPILL_DIR: str="spill"
+    # Worker processes that run the LPR connections and their ingest; 0 keeps
+    # everything in the API process
+    INGEST_WORKERS: int=0
+    # Socket.IO events and live frames in flight from the workers to the API
+    # process; when full, workers drop new ones (database rows are unaffected)
+    INGEST_EVENTS_QUEUE_SIZE: int=64
+    # Repeat sightings of a plate at a gate within this window are merged; 0 disables it
+    PLATE_DEBOUNCE_WINDOW_MS: int=0
+    # A plate seen continuously (a car waiting at the barrier) is still published this often
+    PLATE_DEBOUNCE_MAX_HOLD_MS: int=10000
 
     class Config:
         env_file = ".env"
@@ -1,351 +1,189 @@
-import json
-import uuid
-import base64
-import asyncio
-import socketio
-from datetime import datetime
-from twisted.internet import protocol, reactor, threads
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError
+from twisted.internet import protocol, reactor
+from twisted.protocols.policies import TimeoutMixin
 
-from db.engine import async_session
-from client.models import PlateData
-from utils.image_utils import save_image, save_image_metadata
+from settings import settings
+from tcp_connection.commands import PendingCommands
+from tcp_connection.framing import MessageFramer
+from tcp_connection.handlers import LPRMessageHandler
+from tcp_connection.reconnect import ConnectionState, ConnectionStatus
+from tcp_connection.socketio_server import sio
 
 
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
-
-## Event handler for Socket.IO
-@sio.event
-async def connect(sid, environ):
-    print(f"Socket.IO Client connected: {sid}")
-    await sio.emit('message', {'message': 'Hello from the Socket.IO server'}, to=sid)
-
-@sio.event
-async def disconnect(sid):
-    print(f"Socket.IO Client disconnected: {sid}")
-
-@sio.event
-async def message(sid, data):
-    print(f"Message from {sid}: {data}")
-    await sio.emit('response', {'message': f"Received: {data}"}, to=sid)
-
-
-
-class SimpleTCPClient(protocol.Protocol):
+class SimpleTCPClient(LPRMessageHandler, TimeoutMixin, protocol.Protocol):
     def __init__(self, loop):
         self.auth_message_id = None
         self.loop = loop
+        self._pending_puts = 0
 
-    def connectionMade(self):
-        """
-        Called when a connection to the server is made.
-        Authenticates the client by sending a token.
-        """
-        print(f"[INFO] Connected to {self.transport.getPeer()}")
-        self.authenticate()
-        self.incomplete_data = ""
-
-    def authenticate(self):
-        """
-        Sends an authentication message to the server.
-        """
-        self.auth_message_id = str(uuid.uuid4())
-        auth_message = self._create_auth_message(self.auth_message_id, self.factory.auth_token)
-        self._send_message(auth_message)
-        self.factory.authenticated = False
-        print(f"[INFO] Authentication message sent with ID: {self.auth_message_id}")
-
-    def _create_auth_message(self, message_id, token):
-        """
-        Creates an authentication message.
-        """
-        return json.dumps({
-            "messageId": message_id,
-            "messageType": "authentication",
-            "messageBody": {"token": token}
-        })
-
-    def _send_message(self, message):
-        """
-        Sends a message to the server.
-        """
-        print(f"[INFO] Sending message: {message}")
-        self.transport.write((message + '\n').encode('utf-8'))
-
-    def dataReceived(self, data):
-
-        self.incomplete_data += data.decode('utf-8')
+    @property
+    def auth_token(self):
+        return self.factory.auth_token
 
-        # Split messages by the newline character
-        while '\n' in self.incomplete_data:
-            full_message, self.incomplete_data = self.incomplete_data.split('\n', 1)
-            if full_message:
-                reactor.callFromThread(self._process_message,full_message)
-                #self._handle_message(full_message)
+    @property
+    def authenticated(self):
+        return self.factory.authenticated
 
+    @property
+    def pending_commands(self):
+        return self.factory.pending_commands
 
-
-    def _process_message(self, message):
-        """
-        Processes the received message from the server.
-        This runs in a separate thread.
-        """
-        try:
-            message = message.rstrip()
-            parsed_message = json.loads(message)
-            message_type = parsed_message.get("messageType")
-
-            handlers = {
-                "acknowledge": self._handle_acknowledgment,
-                "command_response": self._handle_command_response,
-                "plates_data": self._handle_plates_data,
-                "live": self._handle_live_data
-            }
-
-            handler = handlers.get(message_type, self._handle_unknown_message)
-            handler(parsed_message)
-
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Failed to parse message: {e}")
-
-    def _handle_acknowledgment(self, message):
-        """
-        Handles acknowledgment from the server.
-        """
-        reply_to = message["messageBody"].get("replyTo")
-        if reply_to == self.auth_message_id:
-            print("[INFO] Authentication successful.")
-            self.factory.authenticated = True
+    def _set_authenticated(self, value):
+        self.factory.authenticated = value
+        if value:
             self.factory.protocol_instance = self
-        else:
-            print(f"[INFO] Acknowledgment for message: {reply_to}")
-
-    def _handle_command_response(self, message):
-        """
-        Handles the command response from the server.
-        """
-        pass
-
-    async def _broadcast_to_socketio(self, message):
-        """
-        Broadcasts a message to all Socket.IO clients.
-        """
-        await sio.emit('message', json.dumps(message))
-
-    def _handle_plates_data(self, message):
-        """
-        Handles 'plates_data' message from the server.
-        Processes the plate information (plate image, plate number, timestamp) and sends it to WebSocket clients.
-        """
-        message_body = message["messageBody"]
-
-        # Extract data from the message body
-        timestamp = message_body.get("timestamp")
-        gate = message_body.get("gate")
-        full_image = message_body.get("full_image")
-        cars = message_body.get("cars", [])
-
-        for car in cars:
-            # Extract plate information
-            plate = car.get("plate", {})
-            plate_number = plate.get("plate", "Unknown")
-            plate_image_base64 = plate.get("plate_image", "")
-
-            # Additional information about the vehicle
-            vehicle_class = car.get("vehicle_class", {})
-            vehicle_type = car.get("vehicle_type", {})
-            ocr_accuracy = car.get("ocr_accuracy", "Unknown")
-            vision_speed = car.get("vision_speed", 0.0)
-
-            # Construct the message to send via Socket.IO
-            socketio_message = {
-                "messageType": "plates_data",
-                "timestamp": timestamp,
-                "gate": gate,
-                "plate_number": plate_number,
-                "plate_image": plate_image_base64,  # Still base64 encoded
-                "ocr_accuracy": ocr_accuracy,
-                "vision_speed": vision_speed,
-                "vehicle_class": vehicle_class,
-                "vehicle_type": vehicle_type,
-                "full_image": full_image
-            }
-            if plate_image_base64:
-                # Process plate image: save and store metadata
-                asyncio.run_coroutine_threadsafe(
-                    self._process_plate_image(plate_image_base64, plate_number, gate),
-                    self.loop
-                )
-
-            # Send the extracted data to the Socket.IO clients
-            # asyncio.run(self._broadcast_to_socketio(socketio_message))
-            # asyncio.run(self._save_plate_data(timestamp, gate, plate_number, ocr_accuracy, vision_speed))
-            # asyncio.create_task(self._broadcast_to_socketio(socketio_message))
-            # asyncio.create_task(self._save_plate_data(timestamp, gate, plate_number, ocr_accuracy, vision_speed))
-            # Run the broadcast and save tasks in the asyncio loop
-            # loop = asyncio.get_event_loop()
-            asyncio.run_coroutine_threadsafe(self._broadcast_to_socketio(socketio_message), self.loop)
-            asyncio.run_coroutine_threadsafe(self._save_plate_data(timestamp, gate, plate_number, ocr_accuracy, vision_speed), self.loop)
-            # Schedule the coroutine to run on the main asyncio event loop
-            # loop = asyncio.get_running_loop()
-            # loop.call_soon_threadsafe(
-            #     asyncio.create_task,
-            #     self._broadcast_to_socketio(socketio_message)
-            # )
-            # loop.call_soon_threadsafe(
-            #     asyncio.create_task,
-            #     self._save_plate_data(timestamp, gate, plate_number, vision_speed, ocr_accuracy)
-            # )
-
-    async def _process_plate_image(self, plate_image_base64, plate_number, gate):
-        # Save the image
-        file_path = await save_image(plate_image_base64, plate_number, gate)
-
-        # Save metadata to the database
-        async with async_session() as session:
-            await save_image_metadata(session, file_path, plate_number, gate)
+            # Only a connection that got as far as authenticating resets the backoff
+            self.factory.resetDelay()
+            self.factory.status.set(ConnectionState.LIVE)
 
-    async def _save_plate_data(self, timestamp, gate, plate_number, vision_speed, ocr_accuracy):
-        if isinstance(timestamp, str):
-            try:
-                timestamp = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
-            except ValueError:
-                print(f"[ERROR] Failed to parse timestamp: {timestamp}")
-                return
-            async with async_session() as session:
-                new_plate_data = PlateData(
-                    timestamp=timestamp,
-                    gate=gate,
-                    plate_number=plate_number,
-                    ocr_accuracy=ocr_accuracy,
-                    vision_speed=vision_speed
-                )
-                try:
-                    session.add(new_plate_data)
-                    await session.commit()
-                    print(f"[INFO] Saved plate data for plate number: {plate_number}")
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    print(f"[ERROR] Could not save plate data: {str(e)}")
+    def _write(self, data):
+        self.transport.write(data)
 
-    def _handle_live_data(self, message):
+    def _submit(self, queue, message):
         """
-        Handles 'live' message from the server.
-        Decodes the base64 image and sends it to WebSocket clients.
+        Hands a message to an ingest queue on the FastAPI event loop.
+        While the queue is full the transport is paused, so backpressure
+        reaches the LPR server instead of piling up in memory.
         """
-        message_body = message["messageBody"]
-        live_image_base64 = message_body.get("live_image")
-        gate = message_body.get("gate")
+        self.loop.call_soon_threadsafe(self._offer, queue, message)
 
-        if live_image_base64:
-            # Send the image (in base64 format) to Socket.IO clients
-            socketio_message = {
-                "messageType": "live",
-                "live_image": live_image_base64,
-                "gate": gate
-            }
-            # asyncio.run(self._broadcast_to_socketio(socketio_message))
-            # asyncio.create_task(self._broadcast_to_socketio(socketio_message))
-            # Run the broadcast task in the asyncio loop
-            # loop = asyncio.get_event_loop()
-            asyncio.run_coroutine_threadsafe(self._broadcast_to_socketio(socketio_message), self.loop)
-            # Schedule the coroutine to run on the main asyncio event loop
-            # loop = asyncio.get_running_loop()
-            # loop.call_soon_threadsafe(
-            #     asyncio.create_task,
-            #     self._broadcast_to_socketio(socketio_message)
-            # )
+    def _offer(self, queue, message):
+        # Runs on the event loop, which owns the queue; only it can tell whether the put has to wait
+        waiter = queue.offer(message)
+        if waiter is not None:
+            reactor.callFromThread(self._put_blocked)
+            self.loop.create_task(waiter).add_done_callback(lambda _: reactor.callFromThread(self._put_done))
 
+    def _put_blocked(self):
+        self._pending_puts += 1
+        if self._pending_puts == 1:
+            self.transport.pauseProducing()
+            # A paused connection is quiet because of us, not the server
+            self.setTimeout(None)
 
+    def _put_done(self):
+        self._pending_puts -= 1
+        if self._pending_puts == 0:
+            self.transport.resumeProducing()
+            self.setTimeout(settings.TCP_IDLE_TIMEOUT or None)
 
-
-    def _handle_unknown_message(self, message):
+    def connectionMade(self):
         """
-        Handles unknown message types from the server.
+        Called when a connection to the server is made.
+        Authenticates the client by sending a token.
         """
-        pass
+        print(f"[INFO] Connected to {self.transport.getPeer()}")
+        self.transport.setTcpKeepAlive(1)
+        self.framer = MessageFramer()
+        self.factory.status.set(ConnectionState.AUTHENTICATING)
+        self.authenticate()
+        self.setTimeout(settings.TCP_IDLE_TIMEOUT or None)
 
-    def send_command(self, command_data):
-        """
-        Sends a command to the server if authenticated.
-        """
-        if self.factory.authenticated:
-            command_message = self._create_command_message(command_data)
-            self._send_message(command_message)
-        else:
-            print("[ERROR] Cannot send command: client is not authenticated.")
+    def dataReceived(self, data):
+        self.resetTimeout()
+        for full_message in self.framer.feed(data):
+            reactor.callFromThread(self._process_message, full_message)
 
-    def _create_command_message(self, command_data):
+    def timeoutConnection(self):
         """
-        Creates a command message.
+        Drops a connection the server has sent nothing on for
+        `TCP_IDLE_TIMEOUT` seconds; the factory then reconnects.
         """
-        return json.dumps({
-            "messageId": str(uuid.uuid4()),
-            "messageType": "command",
-            "messageBody": command_data
-        })
+        print(f"[ERROR] No data from {self.transport.getPeer()} for {settings.TCP_IDLE_TIMEOUT} seconds, dropping connection")
+        self.factory.drop_reason = "idle timeout"
+        self.transport.abortConnection()
 
     def connectionLost(self, reason):
         """
         Handles connection lost events.
+        Reconnecting is left to the factory, which Twisted notifies as well.
         """
         print(f"[INFO] Connection lost: {reason}")
-        self.factory.clientConnectionLost(self.transport.connector, reason)
+        self.setTimeout(None)
+        self.factory.authenticated = False
+        self.factory.protocol_instance = None
+        self.pending_commands.fail_all("Connection lost before the command was answered")
 
 
 class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
+    """
+    Owns reconnecting for the Twisted backend: after a lost or failed
+    connection it retries with exponential backoff and jitter, using the
+    `TCP_RECONNECT_*` settings.
+    """
+
     def __init__(self, auth_token, loop):
         self.auth_token = auth_token
         self.authenticated = False
         self.protocol_instance = None
         self.loop = loop
-        self.initialDelay = 2
-        self.maxDelay = 2
-        self.factor = 1
-        self.jitter = 0
+        self.pending_commands = PendingCommands(loop)
+        self.status = ConnectionStatus()
+        self.connector = None
+        # Why we dropped the connection ourselves, reported instead of Twisted's reason
+        self.drop_reason = None
+        self.initialDelay = settings.TCP_RECONNECT_INITIAL_DELAY
+        self.delay = self.initialDelay
+        self.maxDelay = settings.TCP_RECONNECT_MAX_DELAY
+        self.factor = settings.TCP_RECONNECT_FACTOR
+        self.jitter = settings.TCP_RECONNECT_JITTER
+
+    def startedConnecting(self, connector):
+        self.connector = connector
+        self.status.set(ConnectionState.CONNECTING)
 
     def buildProtocol(self, addr):
         """
-        Builds the protocol instance and resets reconnection delay.
+        Builds the protocol instance.
+        The reconnection delay is reset once the client authenticates.
         """
-        self.resetDelay()
         client = SimpleTCPClient(self.loop)
         client.factory = self
         return client
 
     def clientConnectionLost(self, connector, reason):
-        """
-        Handles lost connection events and retries only when fully disconnected.
-        """
-        print(f"[INFO] Connection lost: {reason}. Reconnecting in 2 seconds...")
-        self._attempt_reconnect(connector)
+        print(f"[INFO] Connection lost: {reason.getErrorMessage()}")
+        self._retry_later(connector, reason)
 
     def clientConnectionFailed(self, connector, reason):
+        print(f"[ERROR] Connection failed: {reason.getErrorMessage()}")
+        self._retry_later(connector, reason)
+
+    def _retry_later(self, connector, reason):
+        error, self.drop_reason = self.drop_reason or reason.getErrorMessage(), None
+        if not self.continueTrying:
+            self.status.set(ConnectionState.STOPPED)
+            return
+        protocol.ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
+        # `retry` has just scheduled the next attempt `self.delay` seconds from now
+        print(f"[INFO] Reconnecting in {self.delay:.1f} seconds...")
+        self.status.set(ConnectionState.BACKING_OFF, error=error, retry_in=self.delay)
+
+    def dispatch_command(self, command_data, message_id=None):
         """
-        Handles failed connection attempts and retries only when fully disconnected.
+        Sends a command from the FastAPI event loop; the write itself
+        happens on the reactor thread.
         """
-        print(f"[ERROR] Connection failed: {reason}. Retrying in 2 seconds...")
-        self._attempt_reconnect(connector)
+        reactor.callFromThread(self.protocol_instance.send_command, command_data, message_id)
 
-    def _attempt_reconnect(self, connector):
+    async def stop(self):
         """
-        Attempts reconnection only if the connector is in the correct state.
+        Stops reconnecting and drops the current connection.
         """
-        if connector.state == 'disconnected':
-            print(f"[INFO] Reconnecting...")
-            reactor.callLater(self.initialDelay, self.retry, connector)
-        else:
-            print(f"[ERROR] Cannot reconnect in current state: {connector.state}. Retrying later...")
-            reactor.callLater(5, self._attempt_reconnect, connector)
+        def _stop():
+            self.stopTrying()
+            self.status.set(ConnectionState.STOPPED)
+            if self.connector is not None:
+                self.connector.disconnect()
+        reactor.callFromThread(_stop)
 
 
 def connect_to_server(server_ip, port, auth_token, loop):
     """
     Connects to the TCP server.
+    The connection is opened on the reactor thread.
     """
     factory = ReconnectingTCPClientFactory(auth_token, loop)
-    reactor.connectTCP(server_ip, port, factory)
+    reactor.callFromThread(reactor.connectTCP, server_ip, port, factory)
     return factory
 
 
@@ -355,6 +193,6 @@ def send_command_to_server(factory, command_data):
     """
     if factory.authenticated and factory.protocol_instance:
         print(f"[INFO] Sending command to server: {command_data}")
-        factory.protocol_instance.send_command(command_data)
+        factory.dispatch_command(command_data)
     else:
         print("[ERROR] Cannot send command: Client is not authenticated or connected.")
@@ -0,0 +1,156 @@
+import asyncio
+import socket
+
+from settings import settings
+from tcp_connection.commands import PendingCommands
+from tcp_connection.framing import MessageFramer
+from tcp_connection.handlers import LPRMessageHandler
+from tcp_connection.reconnect import Backoff, ConnectionState, ConnectionStatus
+
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncTCPClient(LPRMessageHandler):
+    """
+    LPR client built on asyncio streams.
+    Runs directly on the FastAPI event loop, so parsed messages are handled
+    without crossing threads.
+    """
+
+    def __init__(self, server_ip, port, auth_token, loop=None):
+        self.server_ip = server_ip
+        self.port = port
+        self.auth_token = auth_token
+        self.loop = loop or asyncio.get_event_loop()
+        self.auth_message_id = None
+        self.authenticated = False
+        self._writer = None
+        self._task = None
+        self._stopped = False
+        self.pending_commands = PendingCommands(self.loop)
+        self.status = ConnectionStatus()
+        self.backoff = Backoff()
+        # Blocked ingest queue puts the read loop waits on before reading more
+        self._waiters = []
+
+    @property
+    def protocol_instance(self):
+        """
+        Mirrors `ReconnectingTCPClientFactory.protocol_instance` so both
+        backends can be used interchangeably by `send_command_to_server`.
+        """
+        return self if self._writer is not None else None
+
+    def _set_authenticated(self, value):
+        self.authenticated = value
+        if value:
+            # Only a connection that got as far as authenticating resets the backoff
+            self.backoff.reset()
+            self.status.set(ConnectionState.LIVE)
+
+    def dispatch_command(self, command_data, message_id=None):
+        """
+        Mirrors `ReconnectingTCPClientFactory.dispatch_command`; the client
+        already runs on the event loop, so the command is written directly.
+        """
+        self.send_command(command_data, message_id)
+
+    def _write(self, data):
+        self._writer.write(data)
+
+    def _submit(self, queue, message):
+        waiter = queue.offer(message)
+        if waiter is not None:
+            self._waiters.append(waiter)
+
+    def start(self):
+        """
+        Starts the connect/read/reconnect loop as a background task.
+        """
+        self._task = self.loop.create_task(self._run())
+        return self
+
+    async def stop(self):
+        """
+        Stops reconnecting and closes the current connection.
+        """
+        self._stopped = True
+        self.status.set(ConnectionState.STOPPED)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while not self._stopped:
+            self.status.set(ConnectionState.CONNECTING)
+            try:
+                reader, writer = await asyncio.open_connection(self.server_ip, self.port)
+            except Exception as e:
+                print(f"[ERROR] Connection failed: {e}")
+                await self._back_off(str(e))
+                continue
+
+            self._writer = writer
+            print(f"[INFO] Connected to {self.server_ip}:{self.port}")
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            try:
+                self.status.set(ConnectionState.AUTHENTICATING)
+                self.authenticate()
+                await self._read_loop(reader)
+                reason = "connection closed by server"
+            except asyncio.TimeoutError:
+                reason = "idle timeout"
+                print(f"[ERROR] No data from {self.server_ip}:{self.port} for {settings.TCP_IDLE_TIMEOUT} seconds, dropping connection")
+            except (OSError, asyncio.IncompleteReadError) as e:
+                reason = str(e)
+            except Exception as e:
+                # Anything else would end this task for good; reconnect instead
+                reason = repr(e)
+                print(f"[ERROR] Connection to {self.server_ip}:{self.port} failed unexpectedly: {e!r}")
+            finally:
+                self.authenticated = False
+                self._writer = None
+                self.pending_commands.fail_all("Connection lost before the command was answered")
+                for waiter in self._waiters:
+                    waiter.close()
+                self._waiters.clear()
+                writer.close()
+
+            print(f"[INFO] Connection lost: {reason}")
+            await self._back_off(reason)
+
+    async def _back_off(self, reason):
+        """
+        Waits before the next connection attempt. This is the only place the
+        asyncio backend schedules retries.
+        """
+        delay = self.backoff.next_delay()
+        print(f"[INFO] Reconnecting in {delay:.1f} seconds...")
+        self.status.set(ConnectionState.BACKING_OFF, error=reason, retry_in=delay)
+        await asyncio.sleep(delay)
+
+    async def _read_loop(self, reader):
+        framer = MessageFramer()
+        idle_timeout = settings.TCP_IDLE_TIMEOUT or None
+        while True:
+            data = await asyncio.wait_for(reader.read(READ_CHUNK_SIZE), idle_timeout)
+            if not data:
+                return
+            for full_message in framer.feed(data):
+                self._process_message(full_message)
+                # Stop reading while an ingest queue is full
+                while self._waiters:
+                    await self._waiters.pop(0)
+
+
+def connect_to_server(server_ip, port, auth_token, loop):
+    """
+    Connects to the TCP server using asyncio streams.
+    """
+    return AsyncTCPClient(server_ip, port, auth_token, loop).start()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from settings import settings
+from tcp_connection.decoding import encode_message
+
+
+class CommandError(Exception):
+    """
+    A command could not be sent, or its connection was lost before the
+    LPR server answered.
+    """
+
+
+class CommandTimeout(CommandError):
+    """
+    The LPR server did not answer a command in time.
+    """
+
+
+class PendingCommands:
+    """
+    Commands sent on one connection that are waiting for their answer,
+    keyed by `messageId`.
+
+    Futures live on the FastAPI event loop; `resolve` and `fail_all` may be
+    called from the transport's thread (the Twisted reactor) as well.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._futures: Dict[str, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._futures)
+
+    def create(self, message_id: Optional[str] = None) -> Tuple[str, asyncio.Future]:
+        """
+        Registers a new command and returns its message id and the future
+        its answer will be set on. Must be called on the event loop.
+        """
+        message_id = message_id or str(uuid.uuid4())
+        future = self.loop.create_future()
+        self._futures[message_id] = future
+        return message_id, future
+
+    def discard(self, message_id: str):
+        self._futures.pop(message_id, None)
+
+    def resolve(self, message_id: str, message: Dict[str, Any]) -> bool:
+        """
+        Hands the answer to the command `message_id` is replying to.
+        Returns False if no such command is waiting.
+        """
+        if message_id not in self._futures:
+            return False
+        self.loop.call_soon_threadsafe(self._resolve, message_id, message)
+        return True
+
+    def _resolve(self, message_id: str, message: Dict[str, Any]):
+        future = self._futures.pop(message_id, None)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    def fail(self, message_id: str, reason: str):
+        """
+        Fails one waiting command. Must be called on the event loop.
+        """
+        future = self._futures.pop(message_id, None)
+        if future is not None and not future.done():
+            future.set_exception(CommandError(reason))
+
+    def fail_all(self, reason: str):
+        """
+        Fails every waiting command, e.g. when the connection is lost.
+        """
+        if self._futures:
+            self.loop.call_soon_threadsafe(self._fail_all, reason)
+
+    def _fail_all(self, reason: str):
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(CommandError(reason))
+
+
+async def execute_command(connection, command_data: Dict[str, Any],
+                          timeout: float = settings.TCP_COMMAND_TIMEOUT) -> Tuple[str, Dict[str, Any]]:
+    """
+    Sends a command on `connection` and waits for the matching
+    'command_response' or 'acknowledge'.
+    Returns the command's message id and the answer as plain JSON data.
+    """
+    if not connection.authenticated or connection.protocol_instance is None:
+        raise CommandError("Client is not authenticated or connected")
+
+    message_id, future = connection.pending_commands.create()
+    try:
+        connection.dispatch_command(command_data, message_id)
+        response = await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise CommandTimeout(f"No answer to command {message_id} within {timeout} seconds")
+    finally:
+        connection.pending_commands.discard(message_id)
+
+    # Answers are decoded lazily like every other frame; return plain data
+    return message_id, json.loads(encode_message(response))
@@ -0,0 +1,183 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tcp_connection.decoding import ImageField
+
+
+def normalise_plate(plate_number: Optional[str]) -> str:
+    """
+    Reduces a plate reading to its letters and digits so that readings
+    differing only in case, spacing or separators share a debounce key.
+    """
+    if not plate_number or plate_number == "Unknown":
+        return ""
+    return "".join(ch for ch in plate_number.upper() if ch.isalnum())
+
+
+@dataclass
+class PlateSighting:
+    """
+    One car of a 'plates_data' message, or several sightings of the same
+    plate merged by `PlateDebouncer`.
+    """
+    gate: Optional[str]
+    plate_number: str
+    timestamp: datetime
+    raw_timestamp: Optional[str]
+    plate_image: ImageField
+    full_image: Optional[ImageField]
+    ocr_accuracy: Optional[float]
+    vision_speed: Optional[float]
+    vehicle_class: Dict[str, Any] = field(default_factory=dict)
+    vehicle_type: Dict[str, Any] = field(default_factory=dict)
+    hits: int = 1
+    first_seen: float = 0.0
+    deadline: float = 0.0
+
+    def merge(self, other: "PlateSighting"):
+        """
+        Folds a repeat sighting into this one. The first sighting's time is
+        kept; the reading, crop and scene of the most confident one win.
+        """
+        self.hits += other.hits
+        if (other.ocr_accuracy or 0.0) > (self.ocr_accuracy or 0.0):
+            self.plate_number = other.plate_number
+            self.plate_image = other.plate_image
+            self.full_image = other.full_image
+            self.ocr_accuracy = other.ocr_accuracy
+            self.vision_speed = other.vision_speed
+            self.vehicle_class = other.vehicle_class
+            self.vehicle_type = other.vehicle_type
+
+
+class PlateDebouncer:
+    """
+    Merges repeat sightings of a plate at a gate into one event.
+
+    A sighting opens a window keyed by (gate, normalised plate); each repeat
+    inside the window is merged into it and extends the window, so a car
+    passing the gate produces a single event. A window is never held
+    open longer than `max_hold_ms` after its first sighting, so a car
+    standing at the gate is still reported at least that often. Closed
+    windows are passed to `on_flush` together, grouped by the message their
+    scene image came from, so cars seen together are published together.
+    Unreadable plates are never merged. A window of 0 disables debouncing.
+    """
+
+    def __init__(self, window_ms: int, on_flush: Callable[[List[PlateSighting]], Awaitable[None]],
+                 max_hold_ms: int = 0):
+        self.window = window_ms / 1000
+        # Never shorter than the window, so later windows always close later
+        self.max_hold = max(max_hold_ms / 1000, self.window)
+        self.on_flush = on_flush
+        self._pending: Dict[Tuple[Optional[str], str], PlateSighting] = {}
+        self._added = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.sightings = 0
+        self.merged = 0
+        self.flushed = 0
+        self.held_too_long = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the flush task and flushes every open window.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = list(self._pending.values())
+        self._pending.clear()
+        await self._flush_all(pending)
+
+    async def add(self, sightings: List[PlateSighting]):
+        """
+        Adds the sightings of one message. Those that cannot be debounced
+        are published right away, together.
+        """
+        now = asyncio.get_running_loop().time()
+        unmerged = []
+        for sighting in sightings:
+            self.sightings += 1
+            key = (sighting.gate, normalise_plate(sighting.plate_number))
+            if not self.enabled or not key[1]:
+                unmerged.append(sighting)
+                continue
+
+            current = self._pending.get(key)
+            if current is None:
+                sighting.first_seen = now
+                sighting.deadline = now + self.window
+                self._pending[key] = sighting
+                self._added.set()
+            else:
+                current.merge(sighting)
+                current.deadline = min(now + self.window, current.first_seen + self.max_hold)
+                self.merged += 1
+        if unmerged:
+            await self._flush(unmerged)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._added.clear()
+                await self._added.wait()
+                continue
+
+            now = loop.time()
+            expired = [key for key, sighting in self._pending.items() if sighting.deadline <= now]
+            if not expired:
+                # New windows always close after the open ones, so sleeping
+                # until the earliest deadline cannot miss one
+                await asyncio.sleep(min(sighting.deadline for sighting in self._pending.values()) - now)
+                continue
+            closed = [self._pending.pop(key) for key in expired]
+            self.held_too_long += sum(1 for sighting in closed if sighting.deadline - sighting.first_seen >= self.max_hold)
+            await self._flush_all(closed)
+
+    async def _flush_all(self, sightings: List[PlateSighting]):
+        """
+        Publishes closed windows, one batch per gate and scene image.
+        """
+        batches: Dict[Tuple[Optional[str], Optional[str], int], List[PlateSighting]] = {}
+        for sighting in sightings:
+            batches.setdefault((sighting.gate, sighting.raw_timestamp, id(sighting.full_image)), []).append(sighting)
+        for batch in batches.values():
+            await self._flush(batch)
+
+    async def _flush(self, sightings: List[PlateSighting]):
+        try:
+            await self.on_flush(sightings)
+            self.flushed += len(sightings)
+        except Exception as e:
+            self.errors += 1
+            plates = ", ".join(sighting.plate_number for sighting in sightings)
+            print(f"[ERROR] Failed to publish plates {plates} from {sightings[0].gate}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": int(self.window * 1000),
+            "max_hold_ms": int(self.max_hold * 1000),
+            "pending": len(self._pending),
+            "sightings": self.sightings,
+            "merged": self.merged,
+            "flushed": self.flushed,
+            "held_too_long": self.held_too_long,
+            "errors": self.errors,
+        }
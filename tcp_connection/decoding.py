@@ -0,0 +1,173 @@
+import base64
+import json
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+# Fields whose values are (potentially multi-megabyte) base64 JPEGs
+IMAGE_FIELDS = (b"full_image", b"plate_image", b"live_image")
+_IMAGE_FIELD_NAMES = frozenset(name.decode("ascii") for name in IMAGE_FIELDS)
+_IMAGE_KEY_SUFFIX = b'_image"'
+_PLACEHOLDER_PREFIX = "__lazy_image_"
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class LazyImage:
+    """
+    A base64 image field that has not been copied out of the received frame.
+    The payload is only materialised when `base64()` or `decode()` is called.
+    """
+    __slots__ = ("buffer",)
+
+    def __init__(self, buffer: memoryview):
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __bool__(self):
+        return len(self.buffer) > 0
+
+    def __repr__(self):
+        return f"<LazyImage {len(self.buffer)} bytes>"
+
+    def base64(self) -> str:
+        """
+        Returns the base64 payload as a string.
+        """
+        return str(self.buffer, "ascii")
+
+    def decode(self) -> bytes:
+        """
+        Returns the decoded image bytes.
+        """
+        return base64.b64decode(self.buffer)
+
+
+ImageField = Union[str, LazyImage]
+
+
+def image_base64(value: ImageField) -> str:
+    """
+    Returns an image field as a base64 string, whether it is lazy or not.
+    """
+    if isinstance(value, LazyImage):
+        return value.base64()
+    return value
+
+
+def image_bytes(value: ImageField) -> bytes:
+    """
+    Returns the decoded bytes of an image field, whether it is lazy or not.
+    """
+    if isinstance(value, LazyImage):
+        return value.decode()
+    return base64.b64decode(value)
+
+
+def image_payload(value: ImageField):
+    """
+    Returns an image field in a form `base64.b64decode` accepts without
+    copying it to a string first.
+    """
+    if isinstance(value, LazyImage):
+        return value.buffer
+    return value
+
+
+def _skip_whitespace(frame: bytes, cursor: int) -> int:
+    while frame[cursor:cursor + 1] in (b" ", b"\t", b"\r", b"\n"):
+        cursor += 1
+    return cursor
+
+
+def _encode_default(value):
+    if isinstance(value, LazyImage):
+        return value.base64()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """
+    Serialises a decoded message (including `LazyImage` fields) back to a frame.
+    """
+    if orjson is not None:
+        return orjson.dumps(message, default=_encode_default)
+    return json.dumps(message, default=_encode_default).encode("utf-8")
+
+
+def _find_image_values(frame: bytes):
+    """
+    Yields (start, end) offsets of the string values of image fields.
+    Values containing escape sequences are left for the JSON parser.
+    """
+    position = frame.find(_IMAGE_KEY_SUFFIX)
+    while position != -1:
+        resume = position + len(_IMAGE_KEY_SUFFIX)
+        name_end = position + len(b"_image")
+
+        if any(frame.endswith(b'"' + name, 0, name_end) for name in IMAGE_FIELDS):
+            cursor = _skip_whitespace(frame, resume)
+            if frame[cursor:cursor + 1] == b":":
+                cursor = _skip_whitespace(frame, cursor + 1)
+                if frame[cursor:cursor + 1] == b'"':
+                    start = cursor + 1
+                    end = frame.find(b'"', start)
+                    if end != -1 and frame.find(b"\\", start, end) == -1:
+                        yield start, end
+                        resume = end + 1
+
+        position = frame.find(_IMAGE_KEY_SUFFIX, resume)
+
+
+def _restore_images(node, images):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, str):
+                if key in _IMAGE_FIELD_NAMES and value.startswith(_PLACEHOLDER_PREFIX):
+                    node[key] = images[int(value[len(_PLACEHOLDER_PREFIX):])]
+            elif isinstance(value, (dict, list)):
+                _restore_images(value, images)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, (dict, list)):
+                _restore_images(item, images)
+
+
+def decode_message(frame: bytes) -> Dict[str, Any]:
+    """
+    Parses an LPR frame, replacing image fields with `LazyImage` views.
+
+    The image values are cut out of the frame before parsing, so the JSON
+    parser only sees the small routing/metadata part of the message.
+    Raises `JSONDecodeError` for malformed frames.
+    """
+    spans = list(_find_image_values(frame))
+    if not spans:
+        return _loads(frame)
+
+    view = memoryview(frame)
+    images = []
+    pieces = []
+    previous = 0
+    for index, (start, end) in enumerate(spans):
+        pieces.append(view[previous:start])
+        pieces.append(f"{_PLACEHOLDER_PREFIX}{index}".encode("ascii"))
+        images.append(LazyImage(view[start:end]))
+        previous = end
+    pieces.append(view[previous:])
+
+    message = _loads(b"".join(pieces))
+    _restore_images(message, images)
+    return message
@@ -0,0 +1,66 @@
+from typing import List
+
+from settings import settings
+
+
+class MessageFramer:
+    """
+    Splits the newline-delimited LPR stream into complete frames.
+
+    Incoming bytes are appended to a single bytearray and only the newly
+    arrived region is scanned for newlines, so a multi-megabyte frame that
+    arrives in many TCP chunks is scanned and copied once instead of once
+    per chunk. Consumed bytes are dropped from the front of the buffer in a
+    single operation per `feed` call.
+    """
+
+    def __init__(self, max_frame_size: int = settings.TCP_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        # Offset up to which the buffer is known not to contain a newline
+        self._scan_from = 0
+        # Set while skipping the rest of an oversized frame
+        self._discarding = False
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Adds received bytes and returns the frames they complete.
+        Empty frames are skipped.
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+
+        with memoryview(buffer) as view:
+            newline = buffer.find(b'\n', self._scan_from)
+            while newline != -1:
+                if self._discarding:
+                    self._discarding = False
+                elif newline - start > self.max_frame_size:
+                    # Complete but oversized; the partial-frame check below misses these
+                    print(f"[ERROR] Dropping frame larger than {self.max_frame_size} bytes")
+                elif newline > start:
+                    frames.append(view[start:newline].tobytes())
+                start = newline + 1
+                newline = buffer.find(b'\n', start)
+
+        if start:
+            del buffer[:start]
+        self._scan_from = len(buffer)
+
+        if len(buffer) > self.max_frame_size:
+            print(f"[ERROR] Dropping frame larger than {self.max_frame_size} bytes")
+            buffer.clear()
+            self._scan_from = 0
+            self._discarding = True
+
+        return frames
+
+    def reset(self):
+        """
+        Drops any partial frame, e.g. after the connection is lost.
+        """
+        self._buffer.clear()
+        self._scan_from = 0
+        self._discarding = False
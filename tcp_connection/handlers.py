@@ -0,0 +1,137 @@
+import json
+import uuid
+
+from tcp_connection.decoding import JSONDecodeError, decode_message
+from tcp_connection.pipeline import plates_queue, live_queue
+
+
+class LPRMessageHandler:
+    """
+    Transport-independent part of the LPR client protocol.
+
+    Subclasses own the socket and provide:
+      - `auth_token`: the token sent in the authentication handshake
+      - `_write(data)`: write raw bytes to the server
+      - `_submit(queue, message)`: hand a message to an `IngestQueue` on the
+        FastAPI event loop, applying backpressure to the connection if needed
+      - `_set_authenticated(value)`: record the authentication state
+      - `pending_commands`: the connection's `PendingCommands`, which
+        outlives reconnects
+    """
+
+    def authenticate(self):
+        """
+        Sends an authentication message to the server.
+        """
+        self.auth_message_id = str(uuid.uuid4())
+        auth_message = self._create_auth_message(self.auth_message_id, self.auth_token)
+        self._send_message(auth_message)
+        self._set_authenticated(False)
+        print(f"[INFO] Authentication message sent with ID: {self.auth_message_id}")
+
+    def _create_auth_message(self, message_id, token):
+        """
+        Creates an authentication message.
+        """
+        return json.dumps({
+            "messageId": message_id,
+            "messageType": "authentication",
+            "messageBody": {"token": token}
+        })
+
+    def _send_message(self, message):
+        """
+        Sends a message to the server.
+        """
+        print(f"[INFO] Sending message: {message}")
+        self._write((message + '\n').encode('utf-8'))
+
+    def _process_message(self, message):
+        """
+        Processes a single frame (bytes, without the newline) received from the server.
+        Image fields are left as `LazyImage` views and only materialised by
+        the handlers that actually use them.
+        """
+        try:
+            message = message.rstrip()
+            parsed_message = decode_message(message)
+            message_type = parsed_message.get("messageType")
+
+            handlers = {
+                "acknowledge": self._handle_acknowledgment,
+                "command_response": self._handle_command_response,
+                "plates_data": self._handle_plates_data,
+                "live": self._handle_live_data
+            }
+
+            handler = handlers.get(message_type, self._handle_unknown_message)
+            handler(parsed_message)
+
+        except (JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"[ERROR] Failed to parse message: {e}")
+        except Exception as e:
+            # A malformed frame must not take the connection down with it
+            print(f"[ERROR] Failed to handle message: {e!r}")
+
+    def _handle_acknowledgment(self, message):
+        """
+        Handles acknowledgment from the server.
+        """
+        reply_to = (message.get("messageBody") or {}).get("replyTo")
+        if reply_to == self.auth_message_id:
+            print("[INFO] Authentication successful.")
+            self._set_authenticated(True)
+        else:
+            print(f"[INFO] Acknowledgment for message: {reply_to}")
+            self.pending_commands.resolve(reply_to, message)
+
+    def _handle_command_response(self, message):
+        """
+        Handles the command response from the server.
+        The response is handed to the command waiting on its `replyTo` id.
+        """
+        reply_to = message.get("messageBody", {}).get("replyTo")
+        if not self.pending_commands.resolve(reply_to, message):
+            print(f"[INFO] Response to unknown or expired command: {reply_to}")
+
+    def _handle_plates_data(self, message):
+        """
+        Handles 'plates_data' message from the server.
+        The message is queued for `pipeline.process_plates_data`.
+        """
+        self._submit(plates_queue, message)
+
+    def _handle_live_data(self, message):
+        """
+        Handles 'live' message from the server.
+        The message is queued for `pipeline.process_live_data`.
+        """
+        self._submit(live_queue, message)
+
+    def _handle_unknown_message(self, message):
+        """
+        Handles unknown message types from the server.
+        """
+        pass
+
+    def send_command(self, command_data, message_id=None):
+        """
+        Sends a command to the server if authenticated.
+        `message_id` is the id its answer will reply to; a new one is
+        generated when the caller does not wait for the answer.
+        """
+        if self.authenticated:
+            command_message = self._create_command_message(command_data, message_id)
+            self._send_message(command_message)
+        else:
+            print("[ERROR] Cannot send command: client is not authenticated.")
+
+    def _create_command_message(self, command_data, message_id=None):
+        """
+        Creates a command message.
+        """
+        return json.dumps({
+            "messageId": message_id or str(uuid.uuid4()),
+            "messageType": "command",
+            "messageBody": command_data
+        })
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tcp_connection.decoding import decode_message, encode_message
+from tcp_connection.spool import SegmentedSpool
+
+
+class OverflowPolicy(Enum):
+    # Wait for the consumer; the producer (and its TCP connection) stalls
+    BLOCK = "block"
+    # Discard the oldest queued item to make room for the new one
+    DROP_OLDEST = "drop_oldest"
+    # Append to an on-disk spool and replay it once the queue drains
+    SPILL = "spill"
+
+
+# Spill segments are released once fully replayed
+SPILL_SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+class IngestQueue:
+    """
+    Bounded queue between the TCP ingest layer and a consumer coroutine,
+    with an overflow policy applied when the consumer falls behind.
+    Must be used from the event loop thread.
+
+    With the SPILL policy, overflow goes to a `SegmentedSpool` under
+    `spill_dir`: `offer` only buffers the message, and a writer task
+    appends what has accumulated (one fsync per batch) off the event loop.
+    Once spilling, every new message is spilled until the spool is
+    replayed, so messages are consumed in the order they arrived. Replay
+    goes a segment at a time; a segment interrupted by a restart is
+    replayed again in full.
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: OverflowPolicy,
+                 consumer: Callable[[Dict[str, Any]], Awaitable[None]],
+                 spill_dir: Optional[str] = None, spill_segment_bytes: int = SPILL_SEGMENT_BYTES):
+        self.name = name
+        self.policy = policy
+        self.consumer = consumer
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=maxsize)
+        # Opened by start(), so a process can point it at its own directory first
+        self.spill_dir = spill_dir
+        self.spill_segment_bytes = spill_segment_bytes
+        self._spill: Optional[SegmentedSpool] = None
+        # Spilled messages not yet appended to the spool
+        self._unwritten: List[bytes] = []
+        self._spill_added = asyncio.Event()
+        self._spill_written = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._spill_writer: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.errors = 0
+        self.spill_errors = 0
+
+    def _spilling(self) -> bool:
+        return bool(self._unwritten) or self._spill.pending > 0
+
+    def offer(self, message: Dict[str, Any]) -> Optional[Awaitable[None]]:
+        """
+        Applies the overflow policy to a new message.
+        Returns None if the message was handled right away, or an awaitable
+        the producer must wait on before sending more (BLOCK policy only).
+        """
+        self.enqueued += 1
+
+        if self._spill is not None and (self._queue.full() or self._spilling()):
+            self._unwritten.append(encode_message(message))
+            self._spill_added.set()
+            self.spilled += 1
+            return None
+
+        if not self._queue.full():
+            self._queue.put_nowait(message)
+            return None
+
+        if self.policy is OverflowPolicy.DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+            self._queue.put_nowait(message)
+            return None
+
+        self.stalls += 1
+        return self._blocking_put(message)
+
+    async def _blocking_put(self, message: Dict[str, Any]):
+        start = time.perf_counter()
+        await self._queue.put(message)
+        self.stall_seconds += time.perf_counter() - start
+
+    async def put(self, message: Dict[str, Any]):
+        waiter = self.offer(message)
+        if waiter is not None:
+            await waiter
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.policy is OverflowPolicy.SPILL and self._spill is None:
+            directory = os.path.join(self.spill_dir, self.name)
+            self._spill = SegmentedSpool(directory, self.spill_segment_bytes)
+            self._spill_writer = loop.create_task(self._write_spill())
+        if self._task is None:
+            self._task = loop.create_task(self._consume())
+
+    async def stop(self):
+        """
+        Waits for queued messages to be consumed, then stops the consumer.
+        Spilled messages stay on disk and are replayed on the next start.
+        """
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        if self._spill is not None:
+            self._spill_writer.cancel()
+            await asyncio.gather(self._spill_writer, return_exceptions=True)
+            self._spill_writer = None
+            await self._append_unwritten()
+            self._spill.close()
+            self._spill = None
+
+    async def _append_unwritten(self):
+        records = list(self._unwritten)
+        await asyncio.to_thread(self._spill.append, records)
+        # Messages spilled meanwhile were added after these
+        del self._unwritten[:len(records)]
+        self._spill_written.set()
+
+    async def _write_spill(self):
+        while True:
+            await self._spill_added.wait()
+            self._spill_added.clear()
+            while self._unwritten:
+                try:
+                    await self._append_unwritten()
+                except OSError as e:
+                    # Kept in memory and retried; they are still consumed in order
+                    self.spill_errors += 1
+                    print(f"[ERROR] Could not spill {len(self._unwritten)} {self.name} messages: {e}")
+                    await asyncio.sleep(1)
+
+    async def _consume(self):
+        while True:
+            if self._spill is not None and self._queue.empty() and self._spilling():
+                if self._spill.pending:
+                    await self._replay_spill()
+                else:
+                    # Wait for the writer rather than on a queue nothing is added to
+                    self._spill_written.clear()
+                    await self._spill_written.wait()
+                continue
+
+            message = await self._queue.get()
+            try:
+                await self._process(message)
+            finally:
+                self._queue.task_done()
+
+    async def _replay_spill(self):
+        oldest = await asyncio.to_thread(self._spill.oldest)
+        if oldest is None:
+            return
+        seq, records = oldest
+        for record in records:
+            try:
+                message = decode_message(record)
+            except Exception as e:
+                self.errors += 1
+                print(f"[ERROR] Discarding unreadable spilled {self.name} message: {e}")
+                continue
+            await self._process(message)
+        await asyncio.to_thread(self._spill.remove, seq)
+
+    async def _process(self, message: Dict[str, Any]):
+        try:
+            await self.consumer(message)
+            self.processed += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERROR] Failed to process {self.name} message: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.value,
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "spill_pending": self._spill.pending + len(self._unwritten) if self._spill is not None else 0,
+            "spill_errors": self.spill_errors,
+            "spill": self._spill.stats() if self._spill is not None else None,
+            "stalls": self.stalls,
+            "stall_seconds": round(self.stall_seconds, 3),
+            "errors": self.errors,
+        }
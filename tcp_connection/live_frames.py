@@ -0,0 +1,85 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from tcp_connection.decoding import ImageField, image_base64, image_bytes
+from tcp_connection.subscriptions import JSON
+
+
+class LiveFrame:
+    """
+    The newest live frame of a gate. The Socket.IO payload of each format
+    is built once, the first time a subscriber sends it.
+    """
+    __slots__ = ("gate", "image", "version", "_payloads")
+
+    def __init__(self, gate: str, image: ImageField, version: int):
+        self.gate = gate
+        self.image = image
+        self.version = version
+        self._payloads: Dict[str, Any] = {}
+
+    def payload(self, format: str = JSON):
+        payload = self._payloads.get(format)
+        if payload is None:
+            if format == JSON:
+                payload = json.dumps({
+                    "messageType": "live",
+                    "live_image": image_base64(self.image),
+                    "gate": self.gate
+                })
+            else:
+                payload = {
+                    "messageType": "live",
+                    "gate": self.gate,
+                    "live_image": image_bytes(self.image),
+                }
+            self._payloads[format] = payload
+        return payload
+
+
+class LatestFrameStore:
+    """
+    Keeps only the newest live frame per gate.
+
+    Publishing replaces the previous frame of the gate, so memory stays
+    constant however fast frames arrive. Subscribers wait for a newer
+    version and then pull whatever is current, skipping the frames that
+    were replaced in the meantime.
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, LiveFrame] = {}
+        self.version = 0
+        self._updated = asyncio.Event()
+
+    def publish(self, gate: str, image: ImageField):
+        self.version += 1
+        self._frames[gate] = LiveFrame(gate, image, self.version)
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def wait_for_update(self, seen_version: int) -> int:
+        """
+        Waits until a frame newer than `seen_version` is published and
+        returns the current version.
+        """
+        while self.version <= seen_version:
+            await self._updated.wait()
+        return self.version
+
+    def updates_since(self, seen: Dict[str, int]) -> List[LiveFrame]:
+        """
+        Returns the current frame of every gate that changed since the
+        versions in `seen` (gate -> version).
+        """
+        return [
+            frame for gate, frame in self._frames.items()
+            if frame.version > seen.get(gate, 0)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {"gates": len(self._frames), "published": self.version}
+
+
+live_frame_store = LatestFrameStore()
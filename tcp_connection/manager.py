@@ -1,15 +1,49 @@
 import asyncio
-from typing import Dict, Optional
+import traceback
+from typing import Any, Dict, Optional, Tuple, Union
+from sqlalchemy.future import select
 from twisted.internet import protocol
 
+from settings import settings
+from db.engine import async_session
+from client.models import Client
+from tcp_connection.asyncio_client import AsyncTCPClient, connect_to_server as connect_to_server_asyncio
+from tcp_connection.TCPClient import connect_to_server
+from utils.readiness import readiness
+
+
+Connection = Union[protocol.ReconnectingClientFactory, AsyncTCPClient]
+# What a connection was opened with; a change means it has to be reopened
+ConnectionSpec = Tuple[str, int, str]
+
+
+def client_spec(client: Client) -> ConnectionSpec:
+    return (client.ip, client.port, client.auth_token)
+
+
+def open_connection(spec: ConnectionSpec, backend: str = settings.TCP_CLIENT_BACKEND) -> Connection:
+    """
+    Connects to an LPR server with the "twisted" or "asyncio" backend.
+    """
+    connect = connect_to_server_asyncio if backend == "asyncio" else connect_to_server
+    ip, port, auth_token = spec
+    return connect(ip, port, auth_token, asyncio.get_running_loop())
+
 
 class TCPConnectionManager:
-    def __init__(self):
+    def __init__(self, backend: str = settings.TCP_CLIENT_BACKEND):
+        self.backend = backend
         # Using an asyncio lock to manage concurrent access to the connections
-        self.connections: Dict[int, protocol.ReconnectingClientFactory] = {}
+        self.connections: Dict[int, Connection] = {}
+        self.specs: Dict[int, ConnectionSpec] = {}
         self.lock = asyncio.Lock()
+        # Serialises reconcile runs so two of them never open the same client twice
+        self._reconcile_lock = asyncio.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        # Set when connections run in ingest worker processes (see `tcp_connection.sharding`)
+        self.supervisor = None
 
-    async def add_connection(self, client_id: int, factory: protocol.ReconnectingClientFactory):
+    async def add_connection(self, client_id: int, factory: Connection):
         async with self.lock:
             self.connections[client_id] = factory
             print(f"[INFO] Added connection for LPR {client_id}")
@@ -18,15 +52,120 @@ class TCPConnectionManager:
         async with self.lock:
             if client_id in self.connections:
                 del self.connections[client_id]
+                self.specs.pop(client_id, None)
                 print(f"[INFO] Removed connection for LPR {client_id}")
 
-    async def get_connection(self, client_id: int) -> Optional[protocol.ReconnectingClientFactory]:
+    async def get_connection(self, client_id: int) -> Optional[Connection]:
+        if self.supervisor is not None:
+            return self.supervisor.get_connection(client_id)
         async with self.lock:
             return self.connections.get(client_id)
 
-    async def get_all_connections(self) -> Dict[int, protocol.ReconnectingClientFactory]:
+    async def get_all_connections(self) -> Dict[int, Connection]:
         async with self.lock:
             return self.connections
 
+    async def get_statuses(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Returns the connection state machine of every LPR client.
+        """
+        if self.supervisor is not None:
+            return self.supervisor.get_statuses()
+        async with self.lock:
+            return {
+                client_id: {
+                    "backend": "asyncio" if isinstance(connection, AsyncTCPClient) else "twisted",
+                    "authenticated": connection.authenticated,
+                    "pending_commands": len(connection.pending_commands),
+                    **connection.status.as_dict(),
+                }
+                for client_id, connection in self.connections.items()
+            }
+
+    async def reconcile(self):
+        """
+        Brings the running connections in line with the active `Client` rows:
+        opens connections for new clients, closes those of deleted or
+        deactivated ones and reopens those whose address or token changed.
+        Connections that did not change are left alone.
+        """
+        async with self._reconcile_lock:
+            async with async_session() as session:
+                result = await session.execute(select(Client).where(Client.is_active == True))
+                desired = {client.id: client_spec(client) for client in result.unique().scalars().all()}
+
+            if self.supervisor is not None:
+                await self.supervisor.assign(desired)
+            else:
+                await self.sync(desired)
+        # Also clears a failed initial reconcile once the sweeper gets through
+        readiness.mark_ready("lpr_clients")
+
+    async def sync(self, desired: Dict[int, ConnectionSpec]):
+        """
+        Opens, closes and reopens connections so that exactly `desired` runs.
+        """
+        async with self.lock:
+            running = dict(self.specs)
+
+        # Connections are independent of each other; don't let one slow
+        # teardown hold back the rest
+        await asyncio.gather(*(
+            self._close(client_id)
+            for client_id, spec in running.items() if desired.get(client_id) != spec
+        ))
+        await asyncio.gather(*(
+            self._open(client_id, spec)
+            for client_id, spec in desired.items() if running.get(client_id) != spec
+        ))
+
+    async def _open(self, client_id: int, spec: ConnectionSpec):
+        connection = open_connection(spec, self.backend)
+        async with self.lock:
+            self.connections[client_id] = connection
+            self.specs[client_id] = spec
+        print(f"[INFO] Opened connection for LPR client {client_id} at {spec[0]}:{spec[1]}")
+
+    async def _close(self, client_id: int):
+        async with self.lock:
+            connection = self.connections.pop(client_id, None)
+            self.specs.pop(client_id, None)
+        if connection is not None:
+            await connection.stop()
+            print(f"[INFO] Closed connection for LPR client {client_id}")
+
+    def start_sweeper(self, interval: float = settings.TCP_RECONCILE_INTERVAL):
+        """
+        Reconciles every `interval` seconds, picking up client changes made
+        outside the API. An interval of 0 disables the sweep.
+        """
+        if interval > 0 and self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep(interval))
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                # Database outages surface as OSError too; anything escaping here would end the sweep for good
+                print(f"[ERROR] Could not reconcile LPR client connections: {e!r}")
+                traceback.print_exc()
+
+    async def close_all(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self.supervisor is not None:
+            await self.supervisor.stop()
+            return
+        async with self._reconcile_lock:
+            async with self.lock:
+                for client_id, connection in self.connections.items():
+                    await connection.stop()
+                    print(f"[INFO] Closed connection for LPR {client_id}")
+                self.connections.clear()
+                self.specs.clear()
+
 
 connection_manager = TCPConnectionManager()
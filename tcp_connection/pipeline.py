@@ -0,0 +1,303 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+
+from settings import settings
+from utils.image_utils import save_image, shutdown_image_executor
+from tcp_connection.debounce import PlateDebouncer, PlateSighting
+from tcp_connection.decoding import image_base64, image_bytes, image_payload
+from tcp_connection.ingest import IngestQueue, OverflowPolicy
+from tcp_connection.live_frames import live_frame_store
+from tcp_connection.scene_images import scene_image_stats, scene_sampler, scene_writer
+from tcp_connection.socketio_server import emit_stats, emit_to_subscribers, has_subscribers
+from tcp_connection.subscriptions import GROUPED, JSON, PER_CAR, PLATES
+from tcp_connection.writer import plate_writer
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+class LocalBroadcaster:
+    """
+    Where the pipeline sends its events: the Socket.IO sessions and live
+    frame store of this process. Ingest worker processes replace it with
+    `sharding.ForwardingBroadcaster`.
+    """
+
+    def has_subscribers(self, message_type: str, gate: str, grouping: str = PER_CAR) -> bool:
+        return has_subscribers(message_type, gate, grouping)
+
+    async def emit(self, message_type: str, gate: str, build_payload, grouping: str = PER_CAR):
+        await emit_to_subscribers(message_type, gate, build_payload, grouping)
+
+    def publish_live(self, gate: str, image):
+        live_frame_store.publish(gate, image)
+
+
+broadcaster = LocalBroadcaster()
+
+
+def parse_timestamp(timestamp):
+    """
+    Parses the LPR timestamp format.
+    Missing or malformed timestamps fall back to the time of receipt.
+    """
+    if timestamp is None:
+        return datetime.now()
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        print(f"[ERROR] Failed to parse timestamp: {timestamp}")
+        return datetime.now()
+
+
+def to_float(value):
+    """
+    Converts numeric message fields, returning None for missing or invalid values.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def process_plates_data(message: Dict[str, Any]):
+    """
+    Consumes a 'plates_data' message from the server.
+    Each car becomes a `PlateSighting`; with debouncing enabled, repeat
+    sightings of a plate are merged by `plate_debouncer` before they are
+    published, otherwise the message's sightings are published right away.
+    """
+    message_body = message["messageBody"]
+
+    # Extract data from the message body
+    timestamp = parse_timestamp(message_body.get("timestamp"))
+    gate = message_body.get("gate")
+    full_image = message_body.get("full_image")
+    cars = message_body.get("cars", [])
+
+    sightings = []
+    for car in cars:
+        # Extract plate information
+        plate = car.get("plate", {})
+        sightings.append(PlateSighting(
+            gate=gate,
+            plate_number=plate.get("plate", "Unknown"),
+            timestamp=timestamp,
+            raw_timestamp=message_body.get("timestamp"),
+            plate_image=plate.get("plate_image", ""),
+            full_image=full_image,
+            # Additional information about the vehicle
+            ocr_accuracy=to_float(car.get("ocr_accuracy")),
+            vision_speed=to_float(car.get("vision_speed", 0.0)),
+            vehicle_class=car.get("vehicle_class", {}),
+            vehicle_type=car.get("vehicle_type", {}),
+        ))
+
+    if plate_debouncer.enabled:
+        await plate_debouncer.add(sightings)
+    elif sightings:
+        await publish_sightings(gate, message_body.get("timestamp"), full_image, sightings)
+
+
+async def publish_merged_sightings(sightings: List[PlateSighting]):
+    # The debouncer batches sightings sharing a gate and scene image
+    first = sightings[0]
+    await publish_sightings(first.gate, first.raw_timestamp, first.full_image, sightings)
+
+
+async def publish_sightings(gate, raw_timestamp, full_image, sightings: List[PlateSighting]):
+    """
+    Saves the plate images, queues the plate rows for the database and sends
+    the plate information to the Socket.IO clients subscribed to the gate,
+    either one event per car or one grouped event for all of `sightings`.
+    """
+    broadcast = broadcaster.has_subscribers(PLATES, gate, PER_CAR)
+    broadcast_grouped = broadcaster.has_subscribers(PLATES, gate, GROUPED)
+    # The scene image converted once per format, shared by every event
+    full_images: Dict[str, Any] = {}
+    grouped_cars = []
+
+    def scene_image(format):
+        if format not in full_images:
+            if not full_image:
+                full_images[format] = full_image
+            elif format == JSON:
+                full_images[format] = image_base64(full_image)
+            else:
+                full_images[format] = image_bytes(full_image)
+        return full_images[format]
+
+    def car_fields(car_info, format):
+        fields = dict(car_info)
+        plate_image = fields["plate_image"]
+        if format == JSON:
+            fields["plate_image"] = image_base64(plate_image)  # Still base64 encoded
+        else:
+            # Binary attachment; the rest of the payload is the metadata header
+            fields["plate_image"] = image_bytes(plate_image) if plate_image else b""
+        return fields
+
+    def encode(socketio_message, format):
+        return json.dumps(socketio_message) if format == JSON else socketio_message
+
+    # Process plate images: store all crops of the message concurrently, then queue their metadata.
+    # Neither raises, so a failed crop or scene never costs the plate rows.
+    # The scene image is only kept when the gate's sampling policy asks for it
+    keep_scene = bool(full_image) and scene_sampler.should_keep(gate, sightings)
+    scene_image_key, *_ = await asyncio.gather(
+        scene_writer.save(full_image, gate) if keep_scene else asyncio.sleep(0),
+        *(
+            process_plate_image(image_payload(sighting.plate_image), sighting.plate_number, gate, sighting.timestamp)
+            for sighting in sightings if sighting.plate_image
+        )
+    )
+
+    # Queued before anything else can fail: plates_data rows must not be lost
+    for sighting in sightings:
+        await plate_writer.put_plate({
+            "timestamp": sighting.timestamp,
+            "gate": gate,
+            "plate_number": sighting.plate_number,
+            "ocr_accuracy": sighting.ocr_accuracy,
+            "vision_speed": sighting.vision_speed,
+            "hits": sighting.hits,
+            "scene_image_key": scene_image_key,
+        })
+
+    for sighting in sightings:
+        car_info = {
+            "plate_number": sighting.plate_number,
+            "plate_image": sighting.plate_image,
+            "ocr_accuracy": sighting.ocr_accuracy,
+            "vision_speed": sighting.vision_speed,
+            "vehicle_class": sighting.vehicle_class,
+            "vehicle_type": sighting.vehicle_type,
+            "hits": sighting.hits,
+        }
+        if broadcast_grouped:
+            grouped_cars.append(car_info)
+
+        if broadcast:
+            def plate_event(format, car_info=car_info):
+                # Construct the message to send via Socket.IO
+                socketio_message = {
+                    "messageType": "plates_data",
+                    "timestamp": raw_timestamp,
+                    "gate": gate,
+                    **car_fields(car_info, format),
+                    "full_image": scene_image(format)
+                }
+                return encode(socketio_message, format)
+
+            # Send the extracted data to the Socket.IO clients watching this gate
+            await broadcaster.emit(PLATES, gate, plate_event)
+
+    if grouped_cars:
+        def grouped_event(format):
+            # One event for the whole message: the scene image once, then the cars
+            socketio_message = {
+                "messageType": "plates_data",
+                "timestamp": raw_timestamp,
+                "gate": gate,
+                "full_image": scene_image(format),
+                "cars": [car_fields(car_info, format) for car_info in grouped_cars],
+            }
+            return encode(socketio_message, format)
+
+        await broadcaster.emit(PLATES, gate, grouped_event, GROUPED)
+
+
+# Plate crops stored, and crops that could not be; their plate rows are saved either way
+plate_image_stats = {"saved": 0, "failed": 0}
+
+
+async def process_plate_image(plate_image_base64, plate_number, gate, timestamp):
+    # Save the image; file_path holds its image store key
+    try:
+        file_path = await save_image(plate_image_base64, plate_number, gate)
+    except Exception as e:
+        plate_image_stats["failed"] += 1
+        print(f"[ERROR] Could not save plate image of {plate_number} from gate {gate}: {e}")
+        return
+    plate_image_stats["saved"] += 1
+
+    # Queue the metadata for the batched database writer
+    await plate_writer.put_image({
+        "plate_number": plate_number,
+        "gate": gate,
+        "file_path": file_path,
+        "timestamp": timestamp,
+    })
+
+
+async def process_live_data(message: Dict[str, Any]):
+    """
+    Consumes a 'live' message from the server.
+    The frame replaces the gate's previous one in `live_frame_store`; each
+    Socket.IO session's `live_sender` pulls it when the client is ready.
+    """
+    message_body = message["messageBody"]
+    live_image_base64 = message_body.get("live_image")
+    gate = message_body.get("gate")
+
+    if live_image_base64:
+        broadcaster.publish_live(gate, live_image_base64)
+
+
+plates_queue = IngestQueue(
+    "plates_data",
+    maxsize=settings.INGEST_PLATES_QUEUE_SIZE,
+    policy=OverflowPolicy(settings.INGEST_PLATES_POLICY),
+    consumer=process_plates_data,
+    spill_dir=settings.INGEST_SPILL_DIR,
+)
+live_queue = IngestQueue(
+    "live",
+    maxsize=settings.INGEST_LIVE_QUEUE_SIZE,
+    policy=OverflowPolicy.DROP_OLDEST,
+    consumer=process_live_data,
+)
+
+plate_debouncer = PlateDebouncer(settings.PLATE_DEBOUNCE_WINDOW_MS, on_flush=publish_merged_sightings,
+                                 max_hold_ms=settings.PLATE_DEBOUNCE_MAX_HOLD_MS)
+
+ingest_queues = {
+    "plates_data": plates_queue,
+    "live": live_queue,
+}
+
+
+def start_pipeline():
+    if scene_sampler.enabled and not scene_image_stats()["recompression"]:
+        print("[ERROR] Pillow is not installed: kept scene images are stored at full size")
+    plate_writer.start()
+    plate_debouncer.start()
+    for queue in ingest_queues.values():
+        queue.start()
+    print("[INFO] Ingest pipeline started")
+
+
+async def stop_pipeline():
+    """
+    Drains the ingest queues, publishes the sightings still being debounced,
+    then flushes the database writer.
+    """
+    for queue in ingest_queues.values():
+        await queue.stop()
+    await plate_debouncer.stop()
+    await asyncio.to_thread(shutdown_image_executor)
+    await plate_writer.stop()
+    print("[INFO] Ingest pipeline stopped")
+
+
+def pipeline_stats() -> Dict[str, Any]:
+    stats = {name: queue.stats() for name, queue in ingest_queues.items()}
+    stats["plate_debouncer"] = plate_debouncer.stats()
+    stats["plate_writer"] = plate_writer.stats()
+    stats["plate_images"] = dict(plate_image_stats)
+    stats["scene_images"] = scene_image_stats()
+    stats["live_frames"] = live_frame_store.stats()
+    stats["socketio"] = {format: emit.stats() for format, emit in emit_stats.items()}
+    return stats
@@ -0,0 +1,80 @@
+import random
+import time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from settings import settings
+
+
+class ConnectionState(Enum):
+    # Opening the TCP connection
+    CONNECTING = "connecting"
+    # Connected, waiting for the server to acknowledge the auth token
+    AUTHENTICATING = "authenticating"
+    # Authenticated and receiving messages
+    LIVE = "live"
+    # Disconnected, waiting before the next attempt
+    BACKING_OFF = "backing_off"
+    # Stopped on purpose, no more attempts
+    STOPPED = "stopped"
+
+
+class ConnectionStatus:
+    """
+    State machine of one LPR connection, as reported by GET /connections.
+    Written by the transport (possibly on the reactor thread), read by the API.
+    """
+
+    def __init__(self):
+        self.state = ConnectionState.CONNECTING
+        self.since = time.time()
+        self.attempts = 0
+        self.retry_in: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def set(self, state: ConnectionState, error: Optional[str] = None, retry_in: Optional[float] = None):
+        if state is ConnectionState.CONNECTING:
+            self.attempts += 1
+        elif state is ConnectionState.LIVE:
+            self.attempts = 0
+        if error is not None:
+            self.last_error = error
+        self.state = state
+        self.since = time.time()
+        self.retry_in = retry_in
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "since": self.since,
+            "attempts": self.attempts,
+            "retry_in": round(self.retry_in, 2) if self.retry_in is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class Backoff:
+    """
+    Exponential reconnect delay with jitter, so that clients dropped at the
+    same moment do not all come back in lockstep. Same parameters as
+    Twisted's `ReconnectingClientFactory`, which the Twisted backend uses.
+    """
+
+    def __init__(self, initial: float = settings.TCP_RECONNECT_INITIAL_DELAY,
+                 maximum: float = settings.TCP_RECONNECT_MAX_DELAY,
+                 factor: float = settings.TCP_RECONNECT_FACTOR,
+                 jitter: float = settings.TCP_RECONNECT_JITTER):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.delay = initial
+
+    def reset(self):
+        self.delay = self.initial
+
+    def next_delay(self) -> float:
+        self.delay = min(self.delay * self.factor, self.maximum)
+        if self.jitter:
+            self.delay = max(0.0, random.normalvariate(self.delay, self.delay * self.jitter))
+        return self.delay
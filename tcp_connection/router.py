@@ -7,8 +7,10 @@ from typing import List
 from db.engine import get_db
 from client.models import LPR, Client
 from tcp_connection.schemas import CommandRequest
-from tcp_connection.TCPClient import send_command_to_server
+from tcp_connection.commands import CommandError, CommandTimeout, execute_command
 from tcp_connection.manager import connection_manager
+from tcp_connection.pipeline import pipeline_stats
+from authentication.access_level import get_admin_or_staff_user
 
 
 # servers = [
@@ -61,6 +63,30 @@ async def send_command(request: CommandRequest, db:AsyncSession=Depends(get_db))
 
     print(f"Sending command to server {request.client_id}: {command_data}")
 
-    send_command_to_server(factory, command_data)
+    try:
+        message_id, response = await execute_command(factory, command_data)
+    except CommandTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except CommandError as e:
+        raise HTTPException(status_code=502, detail=f"Command to LPR server {request.client_id} failed: {e}")
+
+    return {
+        "status": "Command completed",
+        "command": command_data,
+        "server_id": request.client_id,
+        "messageId": message_id,
+        "response": response,
+    }
+
+
+@tcp_router.get("/connections", dependencies=[Depends(get_admin_or_staff_user)])
+async def connection_statuses():
+    return await connection_manager.get_statuses()
+
 
-    return {"status": "Command sent", "command": command_data, "server_id": request.client_id}
+@tcp_router.get("/ingest/stats", dependencies=[Depends(get_admin_or_staff_user)])
+async def ingest_stats():
+    stats = pipeline_stats()
+    if connection_manager.supervisor is not None:
+        stats["workers"] = connection_manager.supervisor.worker_stats()
+    return stats
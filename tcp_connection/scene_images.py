@@ -0,0 +1,166 @@
+import asyncio
+import io
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import uuid4
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+from settings import settings
+from tcp_connection.debounce import PlateSighting, normalise_plate
+from tcp_connection.decoding import ImageField, image_bytes
+from utils.image_store import plate_image_store
+from utils.image_utils import get_image_executor
+
+
+OFF = "off"
+ALL = "all"
+EVERY = "every"
+WATCHLIST = "watchlist"
+LOW_CONFIDENCE = "low_confidence"
+
+
+class ScenePolicy:
+    """
+    Which 'plates_data' scene images of a gate are kept. Parsed from:
+    "off", "all", "every:<N>" (every Nth message), "watchlist" (a car on
+    SCENE_IMAGE_WATCHLIST) or "low_confidence:<threshold>" (a car read
+    with ocr_accuracy below the threshold).
+    """
+
+    def __init__(self, spec: str):
+        kind, _, param = spec.strip().partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.every = 1
+        self.threshold = 0.0
+        if kind == EVERY:
+            self.every = int(param)
+            if self.every < 1:
+                raise ValueError(f"Invalid scene image policy: {spec}")
+        elif kind == LOW_CONFIDENCE:
+            self.threshold = float(param)
+        elif kind not in (OFF, ALL, WATCHLIST) or param:
+            raise ValueError(f"Invalid scene image policy: {spec}")
+
+
+class SceneSampler:
+    """
+    Applies each gate's `ScenePolicy` to incoming messages.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, default_policy: str, gate_policies: Dict[str, str], watchlist: Iterable[str]):
+        self.default_policy = ScenePolicy(default_policy)
+        self.gate_policies = {gate: ScenePolicy(spec) for gate, spec in gate_policies.items()}
+        self.watchlist = {normalise_plate(plate) for plate in watchlist}
+        self._counters: Dict[Optional[str], int] = {}
+
+        self.considered = 0
+        self.kept = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any(policy.kind != OFF for policy in (self.default_policy, *self.gate_policies.values()))
+
+    def policy(self, gate: Optional[str]) -> ScenePolicy:
+        return self.gate_policies.get(gate, self.default_policy)
+
+    def should_keep(self, gate: Optional[str], sightings: List[PlateSighting]) -> bool:
+        policy = self.policy(gate)
+        if policy.kind == OFF:
+            return False
+        self.considered += 1
+
+        if policy.kind == ALL:
+            keep = True
+        elif policy.kind == EVERY:
+            count = self._counters.get(gate, 0)
+            self._counters[gate] = count + 1
+            keep = count % policy.every == 0
+        elif policy.kind == WATCHLIST:
+            keep = any(normalise_plate(sighting.plate_number) in self.watchlist for sighting in sightings)
+        else:
+            keep = any(sighting.ocr_accuracy is not None and sighting.ocr_accuracy < policy.threshold
+                       for sighting in sightings)
+
+        if keep:
+            self.kept += 1
+        return keep
+
+
+class SceneImageWriter:
+    """
+    Recompresses kept scene images and writes them to the plate image store.
+    Without Pillow (see requirements.txt) the received JPEG is stored as is.
+    """
+
+    def __init__(self, quality: int):
+        self.quality = quality
+        self.saved = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def recompress(self, data: bytes) -> bytes:
+        if Image is None:
+            return data
+        with Image.open(io.BytesIO(data)) as image:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=self.quality, optimize=True)
+        # Already smaller than our quality setting would make it
+        return output.getvalue() if output.tell() < len(data) else data
+
+    def write(self, full_image: ImageField, gate: Optional[str]) -> str:
+        """
+        Blocking; `save` runs it on the image pool. Returns the image store key.
+        """
+        data = image_bytes(full_image)
+        compressed = self.recompress(data)
+
+        timestamp = datetime.now()
+        key = (f"images/{timestamp.year}/{timestamp.month}/{timestamp.day}/{gate}/scenes/"
+               f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{uuid4().hex}.jpg")
+        plate_image_store().put(key, compressed, content_type="image/jpeg")
+
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        return key
+
+    async def save(self, full_image: ImageField, gate: Optional[str]) -> Optional[str]:
+        """
+        Stores a scene image without blocking the event loop. Returns its key,
+        or None if it could not be stored; the plate row is saved either way.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            key = await loop.run_in_executor(get_image_executor(), self.write, full_image, gate)
+        except Exception as e:
+            self.failed += 1
+            print(f"[ERROR] Could not save scene image for gate {gate}: {e}")
+            return None
+        self.saved += 1
+        return key
+
+
+scene_sampler = SceneSampler(settings.SCENE_IMAGE_POLICY, settings.SCENE_IMAGE_GATE_POLICIES,
+                             settings.SCENE_IMAGE_WATCHLIST)
+scene_writer = SceneImageWriter(settings.SCENE_IMAGE_QUALITY)
+
+
+def scene_image_stats() -> Dict[str, Any]:
+    return {
+        "enabled": scene_sampler.enabled,
+        "recompression": Image is not None,
+        "considered": scene_sampler.considered,
+        "kept": scene_sampler.kept,
+        "saved": scene_writer.saved,
+        "failed": scene_writer.failed,
+        "bytes_in": scene_writer.bytes_in,
+        "bytes_out": scene_writer.bytes_out,
+    }
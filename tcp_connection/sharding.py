@@ -0,0 +1,422 @@
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from settings import settings
+from tcp_connection import pipeline
+from tcp_connection.commands import CommandError, PendingCommands
+from tcp_connection.decoding import LazyImage, encode_message
+from tcp_connection.live_frames import live_frame_store
+from tcp_connection.manager import ConnectionSpec, TCPConnectionManager
+from tcp_connection.socketio_server import emit_to_subscribers, subscribed_rooms
+from tcp_connection.subscriptions import BINARY, FORMATS, LIVE, PER_CAR, rooms_for
+
+
+# Seconds between worker status reports and supervisor health checks
+STATUS_INTERVAL = 1.0
+# Seconds before a worker that died is started again
+RESTART_DELAY = 2.0
+
+# Worker processes are spawned, not forked: the API process runs threads
+# (the Twisted reactor) and an event loop that must not be inherited
+_mp = multiprocessing.get_context("spawn")
+
+
+def rendezvous_owner(client_id: int, workers: Iterable[int]) -> int:
+    """
+    Picks the worker that owns a client by rendezvous (highest random weight)
+    hashing. The choice is stable across processes and restarts, and when a
+    worker leaves or joins only the clients it owns move.
+    """
+    def weight(worker_id):
+        return hashlib.blake2b(f"{client_id}:{worker_id}".encode(), digest_size=8).digest()
+    return max(workers, key=weight)
+
+
+def jsonable_images(payload):
+    """
+    Converts the binary image attachments of a forwarded payload back to
+    base64 strings for JSON-format subscribers.
+    """
+    if isinstance(payload, bytes):
+        return base64.b64encode(payload).decode("ascii")
+    if isinstance(payload, dict):
+        return {key: jsonable_images(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [jsonable_images(item) for item in payload]
+    return payload
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+class ForwardingBroadcaster:
+    """
+    Pipeline broadcaster of a worker process. Events are sent to the API
+    process, which owns the Socket.IO sessions; the API process keeps
+    `rooms` up to date so nothing is built for gates nobody watches.
+
+    The events queue is bounded. While it is full, new emits and live
+    frames are dropped and counted rather than queued: the subscribers
+    miss them, as they would miss live frames anyway, but the plate rows
+    are saved by the worker regardless.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.rooms: Set[str] = set()
+        self.dropped = {"emit": 0, "live": 0}
+
+    def _forward(self, event: Dict[str, Any]):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.dropped[event["kind"]] += 1
+
+    def has_subscribers(self, message_type: str, gate: str, grouping: str = PER_CAR) -> bool:
+        return any(
+            room in self.rooms
+            for format in FORMATS
+            for room in rooms_for(message_type, gate, format, grouping)
+        )
+
+    async def emit(self, message_type: str, gate: str, build_payload, grouping: str = PER_CAR):
+        # Binary payloads carry the images as raw bytes, the compact form
+        self._forward({
+            "kind": "emit",
+            "message_type": message_type,
+            "gate": gate,
+            "grouping": grouping,
+            "payload": build_payload(BINARY),
+        })
+
+    def publish_live(self, gate: str, image):
+        if self.has_subscribers(LIVE, gate):
+            data = bytes(image.buffer) if isinstance(image, LazyImage) else image.encode("ascii")
+            self._forward({"kind": "live", "gate": gate, "image": data})
+
+    def stats(self) -> Dict[str, Any]:
+        return {"dropped": dict(self.dropped)}
+
+
+def worker_main(worker_id: int, commands, events):
+    """
+    Entry point of an ingest worker process.
+    """
+    asyncio.run(_run_worker(worker_id, commands, events))
+
+
+async def _run_worker(worker_id: int, commands, events):
+    loop = asyncio.get_running_loop()
+    broadcaster = ForwardingBroadcaster(events)
+    pipeline.broadcaster = broadcaster
+    if settings.PLATE_SPOOL_DIR:
+        # Each worker replays its own spool; ids are reused across restarts
+        pipeline.plate_writer.spool_dir = os.path.join(settings.PLATE_SPOOL_DIR, f"worker-{worker_id}")
+    # Likewise the spilled plates_data messages, which the API process spills to the top directory
+    pipeline.plates_queue.spill_dir = os.path.join(settings.INGEST_SPILL_DIR, f"worker-{worker_id}")
+    pipeline.start_pipeline()
+    # Workers have no reactor thread; connections run on the worker's own loop
+    manager = TCPConnectionManager(backend="asyncio")
+    reporter = loop.create_task(_report_status(worker_id, manager, events))
+    print(f"[INFO] Ingest worker {worker_id} started")
+
+    try:
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            op = command["op"]
+            if op == "stop":
+                break
+            if op == "sync":
+                await manager.sync(command["specs"])
+            elif op == "rooms":
+                broadcaster.rooms = command["rooms"]
+            elif op == "command":
+                loop.create_task(_run_command(manager, events, command))
+    finally:
+        reporter.cancel()
+        await manager.close_all()
+        await pipeline.stop_pipeline()
+        print(f"[INFO] Ingest worker {worker_id} stopped")
+
+
+async def _send(events, event: Dict[str, Any]):
+    """
+    Queues an event that must not be dropped, waiting off the event loop
+    while the events queue is full.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, events.put, event)
+
+
+async def _report_status(worker_id: int, manager: TCPConnectionManager, events):
+    while True:
+        await _send(events, {
+            "kind": "status",
+            "worker": worker_id,
+            "connections": await manager.get_statuses(),
+            "stats": {**pipeline.pipeline_stats(), "forwarding": pipeline.broadcaster.stats()},
+        })
+        await asyncio.sleep(STATUS_INTERVAL)
+
+
+async def _run_command(manager: TCPConnectionManager, events, command: Dict[str, Any]):
+    """
+    Sends a command relayed by the API process and relays the answer back.
+    """
+    client_id, message_id = command["client_id"], command["message_id"]
+    connection = await manager.get_connection(client_id)
+    if connection is None or not connection.authenticated:
+        await _send(events, {"kind": "command_error", "client_id": client_id, "message_id": message_id,
+                             "error": "Client is not authenticated or connected"})
+        return
+
+    _, future = connection.pending_commands.create(message_id)
+    try:
+        connection.dispatch_command(command["command"], message_id)
+        response = await asyncio.wait_for(future, command["timeout"])
+    except asyncio.TimeoutError:
+        # The API process times the command out on its side
+        return
+    except CommandError as e:
+        await _send(events, {"kind": "command_error", "client_id": client_id, "message_id": message_id, "error": str(e)})
+        return
+    finally:
+        connection.pending_commands.discard(message_id)
+    await _send(events, {"kind": "command_result", "client_id": client_id, "message_id": message_id,
+                         "response": json.loads(encode_message(response))})
+
+
+# ---------------------------------------------------------------------------
+# API process
+# ---------------------------------------------------------------------------
+
+class RemoteConnection:
+    """
+    Stand-in for a connection that runs in a worker process, so
+    `execute_command` and /send-command work the same in sharded mode.
+    """
+
+    def __init__(self, supervisor: "IngestSupervisor", client_id: int):
+        self.supervisor = supervisor
+        self.client_id = client_id
+        self.pending_commands = PendingCommands(supervisor.loop)
+
+    @property
+    def authenticated(self) -> bool:
+        return self.supervisor.statuses.get(self.client_id, {}).get("authenticated", False)
+
+    @property
+    def protocol_instance(self):
+        return self if self.authenticated else None
+
+    def dispatch_command(self, command_data, message_id=None):
+        self.supervisor.send_to_owner(self.client_id, {
+            "op": "command",
+            "client_id": self.client_id,
+            "message_id": message_id,
+            "command": command_data,
+            "timeout": settings.TCP_COMMAND_TIMEOUT,
+        })
+
+
+class WorkerHandle:
+    def __init__(self, worker_id: int, events):
+        self.worker_id = worker_id
+        self.commands = _mp.Queue()
+        self.process = _mp.Process(
+            target=worker_main, args=(worker_id, self.commands, events),
+            name=f"ingest-worker-{worker_id}", daemon=True,
+        )
+        self.process.start()
+        # Set once the worker has reported in; only ready workers own clients
+        self.ready = False
+        self.specs: Optional[Dict[int, ConnectionSpec]] = None
+        self.rooms: Optional[Set[str]] = None
+        self.stats: Dict[str, Any] = {}
+
+
+class IngestSupervisor:
+    """
+    Runs the LPR connections in `worker_count` processes.
+
+    Clients are assigned to workers by `rendezvous_owner`. Workers do the
+    framing, parsing, image persistence and database writes of their
+    clients and forward Socket.IO payloads and live frames here for
+    fan-out. A worker that dies has its clients moved to the others and
+    is restarted; once it reports in again it gets its clients back.
+    """
+
+    def __init__(self, worker_count: int):
+        self.worker_count = worker_count
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.workers: Dict[int, WorkerHandle] = {}
+        self.desired: Dict[int, ConnectionSpec] = {}
+        self.owners: Dict[int, int] = {}
+        self.statuses: Dict[int, Dict[str, Any]] = {}
+        self.remotes: Dict[int, RemoteConnection] = {}
+        self._events = None
+        self._inbox: Optional[asyncio.Queue] = None
+        # Free inbox slots; the reader thread waits on it instead of
+        # checking the loop-owned queue, so a full inbox backs up into the
+        # workers' bounded events queue
+        self._inbox_slots: Optional[threading.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._reader: Optional[threading.Thread] = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._events = _mp.Queue(maxsize=settings.INGEST_EVENTS_QUEUE_SIZE)
+        self._inbox = asyncio.Queue(maxsize=settings.INGEST_EVENTS_QUEUE_SIZE)
+        self._inbox_slots = threading.Semaphore(settings.INGEST_EVENTS_QUEUE_SIZE)
+        for worker_id in range(self.worker_count):
+            self.workers[worker_id] = WorkerHandle(worker_id, self._events)
+        self._reader = threading.Thread(target=self._read_events, name="ingest-events", daemon=True)
+        self._reader.start()
+        self._tasks = [
+            self.loop.create_task(self._dispatch_events()),
+            self.loop.create_task(self._monitor()),
+        ]
+        print(f"[INFO] Started {self.worker_count} ingest workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for handle in self.workers.values():
+            handle.commands.put({"op": "stop"})
+        for handle in self.workers.values():
+            await self.loop.run_in_executor(None, handle.process.join, 10)
+            if handle.process.is_alive():
+                handle.process.terminate()
+        try:
+            self._events.put_nowait(None)
+        except queue.Full:
+            # The reader thread is waiting for an inbox slot that no one frees now; it is a daemon
+            pass
+        self.workers.clear()
+        print("[INFO] Ingest workers stopped")
+
+    async def assign(self, desired: Dict[int, ConnectionSpec]):
+        self.desired = desired
+        self.remotes = {
+            client_id: self.remotes.get(client_id) or RemoteConnection(self, client_id)
+            for client_id in desired
+        }
+        self._rebalance()
+
+    def _rebalance(self):
+        ready = [worker_id for worker_id, handle in self.workers.items() if handle.ready]
+        if not ready:
+            return
+        self.owners = {client_id: rendezvous_owner(client_id, ready) for client_id in self.desired}
+        for worker_id, handle in self.workers.items():
+            specs = {
+                client_id: spec for client_id, spec in self.desired.items()
+                if self.owners[client_id] == worker_id
+            } if handle.ready else {}
+            if specs != handle.specs:
+                handle.commands.put({"op": "sync", "specs": specs})
+                handle.specs = specs
+
+    def send_to_owner(self, client_id: int, command: Dict[str, Any]):
+        owner = self.owners.get(client_id)
+        if owner is None or owner not in self.workers:
+            self.remotes[client_id].pending_commands.fail(command["message_id"], "Client is not assigned to a worker")
+            return
+        self.workers[owner].commands.put(command)
+
+    def get_connection(self, client_id: int) -> Optional[RemoteConnection]:
+        return self.remotes.get(client_id)
+
+    def get_statuses(self) -> Dict[int, Dict[str, Any]]:
+        return {
+            client_id: {**self.statuses.get(client_id, {"state": "unassigned"}), "worker": self.owners.get(client_id)}
+            for client_id in self.desired
+        }
+
+    def worker_stats(self) -> Dict[int, Dict[str, Any]]:
+        return {
+            worker_id: {"pid": handle.process.pid, "alive": handle.process.is_alive(), "ready": handle.ready, **handle.stats}
+            for worker_id, handle in self.workers.items()
+        }
+
+    def _read_events(self):
+        """
+        Moves events from the worker queue to the event loop (reader thread).
+        """
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            self._inbox_slots.acquire()
+            self.loop.call_soon_threadsafe(self._inbox.put_nowait, event)
+
+    async def _dispatch_events(self):
+        while True:
+            event = await self._inbox.get()
+            self._inbox_slots.release()
+            try:
+                await self._handle_event(event)
+            except Exception as e:
+                print(f"[ERROR] Failed to handle ingest worker event {event.get('kind')}: {e}")
+
+    async def _handle_event(self, event: Dict[str, Any]):
+        kind = event["kind"]
+        if kind == "emit":
+            payload = event["payload"]
+            await emit_to_subscribers(
+                event["message_type"], event["gate"],
+                lambda format: payload if format == BINARY else json.dumps(jsonable_images(payload)),
+                event["grouping"],
+            )
+        elif kind == "live":
+            live_frame_store.publish(event["gate"], LazyImage(memoryview(event["image"])))
+        elif kind == "status":
+            handle = self.workers.get(event["worker"])
+            if handle is None:
+                return
+            handle.stats = event["stats"]
+            for client_id, status in event["connections"].items():
+                if self.owners.get(client_id) == event["worker"]:
+                    self.statuses[client_id] = status
+            if not handle.ready:
+                handle.ready = True
+                print(f"[INFO] Ingest worker {event['worker']} is ready")
+                self._rebalance()
+        elif kind == "command_result":
+            remote = self.remotes.get(event["client_id"])
+            if remote is not None:
+                remote.pending_commands.resolve(event["message_id"], event["response"])
+        elif kind == "command_error":
+            remote = self.remotes.get(event["client_id"])
+            if remote is not None:
+                remote.pending_commands.fail(event["message_id"], event["error"])
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            for worker_id, handle in list(self.workers.items()):
+                if not handle.process.is_alive():
+                    await self._replace_worker(worker_id, handle)
+            rooms = subscribed_rooms()
+            for handle in self.workers.values():
+                if handle.ready and rooms != handle.rooms:
+                    handle.commands.put({"op": "rooms", "rooms": rooms})
+                    handle.rooms = rooms
+
+    async def _replace_worker(self, worker_id: int, handle: WorkerHandle):
+        print(f"[ERROR] Ingest worker {worker_id} died with exit code {handle.process.exitcode}, rebalancing its clients")
+        handle.ready = False
+        for client_id, owner in self.owners.items():
+            if owner == worker_id:
+                self.statuses.pop(client_id, None)
+        # Hand its clients to the surviving workers right away
+        self._rebalance()
+        await asyncio.sleep(RESTART_DELAY)
+        self.workers[worker_id] = WorkerHandle(worker_id, self._events)
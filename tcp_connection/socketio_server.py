@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Set
+import socketio
+
+from tcp_connection.live_frames import live_frame_store
+from tcp_connection.subscriptions import (JSON, LIVE, FORMATS, GROUPINGS, MESSAGE_TYPES, PER_CAR,
+    Subscription, subscriptions, resolve_gates, rooms_for)
+
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+# One live frame sender task per connected Socket.IO session
+live_senders: Dict[str, asyncio.Task] = {}
+
+
+class EmitStats:
+    """
+    Payload size and CPU time of the events sent in one format.
+    CPU time covers building the payload and handing it to Socket.IO.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, size: int, cpu_seconds: float):
+        self.events += 1
+        self.bytes += size
+        self.cpu_seconds += cpu_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "bytes": self.bytes,
+            "avg_bytes": self.bytes // self.events if self.events else 0,
+            "avg_cpu_us": round(self.cpu_seconds / self.events * 1e6, 1) if self.events else 0.0,
+        }
+
+
+emit_stats = {format: EmitStats() for format in FORMATS}
+
+
+def payload_size(data) -> int:
+    """
+    Approximate size of an event payload on the wire: binary attachments
+    count their length, everything else its JSON length.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    if isinstance(data, str):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(len(key) + payload_size(value) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return sum(payload_size(item) for item in data)
+    return len(json.dumps(data))
+
+
+def event_name(message_type: str, format: str) -> str:
+    """
+    JSON payloads keep the original 'message' event; binary payloads use
+    the message type as the event name.
+    """
+    return 'message' if format == JSON else message_type
+
+
+def _has_members(rooms: List[str]) -> bool:
+    namespace_rooms = sio.manager.rooms.get('/', {})
+    return any(namespace_rooms.get(room) for room in rooms)
+
+
+def subscribed_rooms() -> Set[str]:
+    """
+    Names of the subscription rooms that currently have members.
+    """
+    return {
+        room for room, members in sio.manager.rooms.get('/', {}).items()
+        if members and isinstance(room, str) and ':' in room
+    }
+
+
+def has_subscribers(message_type: str, gate: str, grouping: str = PER_CAR) -> bool:
+    """
+    Returns True if any session is subscribed to `message_type` events from `gate` in `grouping`.
+    """
+    return any(_has_members(rooms_for(message_type, gate, format, grouping)) for format in FORMATS)
+
+
+async def emit_to_subscribers(message_type: str, gate: str, build_payload: Callable[[str], Any],
+                              grouping: str = PER_CAR):
+    """
+    Sends an event only to the sessions subscribed to `message_type` events from `gate` in `grouping`.
+    `build_payload(format)` is called once per format that has subscribers.
+    """
+    for format in FORMATS:
+        rooms = rooms_for(message_type, gate, format, grouping)
+        if not _has_members(rooms):
+            continue
+        start = time.process_time()
+        data = build_payload(format)
+        await sio.emit(event_name(message_type, format), data, to=rooms)
+        emit_stats[format].record(payload_size(data), time.process_time() - start)
+
+
+async def wait_for_send_buffer(sid):
+    """
+    Waits until the packets already queued for a session have been written
+    to its transport, i.e. until the client is ready for the next frame.
+    """
+    eio_sid = sio.manager.eio_sid_from_sid(sid, '/')
+    socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    if socket is not None:
+        await socket.queue.join()
+
+
+async def live_sender(sid):
+    """
+    Sends the newest live frame of each gate to one session.
+    A slow client skips the frames published while it was busy instead of
+    receiving a growing backlog of stale ones.
+    """
+    seen: Dict[str, int] = {}
+    version = 0
+    while True:
+        await wait_for_send_buffer(sid)
+        version = await live_frame_store.wait_for_update(version)
+        subscription = subscriptions.get(sid)
+        for frame in live_frame_store.updates_since(seen):
+            seen[frame.gate] = frame.version
+            if subscription is not None and subscription.wants(LIVE, frame.gate):
+                start = time.process_time()
+                data = frame.payload(subscription.format)
+                await sio.emit(event_name(LIVE, subscription.format), data, to=sid)
+                emit_stats[subscription.format].record(payload_size(data), time.process_time() - start)
+
+
+async def set_subscription(sid, subscription: Subscription):
+    """
+    Moves a session from the rooms of its previous subscription to the rooms of the new one.
+    """
+    previous = subscriptions.get(sid)
+    if previous is not None:
+        for room in previous.rooms():
+            await sio.leave_room(sid, room)
+    subscriptions[sid] = subscription
+    for room in subscription.rooms():
+        await sio.enter_room(sid, room)
+
+
+## Event handler for Socket.IO
+@sio.event
+async def connect(sid, environ):
+    print(f"Socket.IO Client connected: {sid}")
+    await sio.emit('message', {'message': 'Hello from the Socket.IO server'}, to=sid)
+    await set_subscription(sid, Subscription())
+    live_senders[sid] = asyncio.create_task(live_sender(sid))
+
+@sio.event
+async def disconnect(sid):
+    print(f"Socket.IO Client disconnected: {sid}")
+    subscriptions.pop(sid, None)
+    sender = live_senders.pop(sid, None)
+    if sender is not None:
+        sender.cancel()
+
+@sio.event
+async def message(sid, data):
+    print(f"Message from {sid}: {data}")
+    await sio.emit('response', {'message': f"Received: {data}"}, to=sid)
+
+@sio.event
+async def subscribe(sid, data):
+    """
+    Limits the events a session receives.
+
+    `data` may contain `gates` (names or ids), `cameras` and `buildings`
+    (ids) to filter by gate, and `types` ("plates_data", "live") to filter
+    by message type. Omitted filters match everything.
+
+    `format` selects the payload format: "json" (default) sends JSON strings
+    on the 'message' event with base64 images; "binary" sends dicts on the
+    'plates_data' and 'live' events with the images as binary attachments.
+
+    `grouping` selects how plates_data messages are sent: "per_car" (default)
+    sends one event per car, each with the scene image; "grouped" sends one
+    event per message with the scene image once and a `cars` list.
+    """
+    data = data or {}
+    message_types = set(data.get("types") or MESSAGE_TYPES)
+    unknown_types = message_types - set(MESSAGE_TYPES)
+    if unknown_types:
+        return {"error": f"Unknown message types: {sorted(unknown_types)}"}
+    format = data.get("format") or JSON
+    if format not in FORMATS:
+        return {"error": f"Unknown format: {format}"}
+    grouping = data.get("grouping") or PER_CAR
+    if grouping not in GROUPINGS:
+        return {"error": f"Unknown grouping: {grouping}"}
+
+    gates = await resolve_gates(
+        data.get("gates") or [],
+        data.get("cameras") or [],
+        data.get("buildings") or [],
+    )
+    await set_subscription(sid, Subscription(gates=gates, message_types=message_types, format=format, grouping=grouping))
+    print(f"Socket.IO Client {sid} subscribed to {sorted(message_types)} from {sorted(gates) if gates is not None else 'all gates'} as {format}/{grouping}")
+    return {
+        "gates": sorted(gates) if gates is not None else None,
+        "types": sorted(message_types),
+        "format": format,
+        "grouping": grouping,
+    }
@@ -0,0 +1,171 @@
+import os
+import re
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SegmentedSpool:
+    """
+    Append-only log of records on disk, split into numbered segment files
+    so that replayed data can be released a whole segment at a time.
+
+    Each `append` call writes its records to the newest segment and fsyncs
+    once, so a batch costs one disk flush no matter how many records it
+    holds. Replay reads the oldest segment; the newest one is sealed first
+    so appends carry on in a fresh file. Records are opaque bytes, stamped
+    with the time they were spooled.
+
+    Thread-safe: the writer appends from the event loop while replay may
+    read and remove segments from a worker thread.
+    """
+    _HEADER = struct.Struct(">dI")
+    _SEGMENT = re.compile(r"^(\d{12})\.seg$")
+
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._active = None
+        # Per segment: [record count, size in bytes, time of its first record]
+        self._segments: Dict[int, List[Any]] = {}
+
+        self.appended = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.fsyncs = 0
+
+        for name in sorted(os.listdir(directory)):
+            match = self._SEGMENT.match(name)
+            if match:
+                self._segments[int(match.group(1))] = self._scan(os.path.join(directory, name))
+        # Never append to a segment left over from a previous run
+        self._active_seq = max(self._segments, default=0) + 1
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}.seg")
+
+    def _scan(self, path: str) -> List[Any]:
+        count, first = 0, None
+        with open(path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + self._HEADER.size <= size:
+                spooled_at, length = self._HEADER.unpack(f.read(self._HEADER.size))
+                if offset + self._HEADER.size + length > size:
+                    break
+                f.seek(length, os.SEEK_CUR)
+                offset += self._HEADER.size + length
+                count += 1
+                if first is None:
+                    first = spooled_at
+            # Drop a record that was only partially written before a crash
+            f.truncate(offset)
+        return [count, offset, first]
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return sum(segment[0] for segment in self._segments.values())
+
+    def append(self, records: List[bytes]):
+        """
+        Appends `records` and makes them durable before returning.
+        """
+        if not records:
+            return
+        now = time.time()
+        data = b"".join(self._HEADER.pack(now, len(record)) + record for record in records)
+        with self._lock:
+            segment = self._segments.get(self._active_seq)
+            if segment is not None and segment[1] >= self.segment_bytes:
+                self._seal()
+                segment = None
+            if segment is None:
+                segment = self._segments[self._active_seq] = [0, 0, now]
+                self._active = open(self._path(self._active_seq), "ab")
+
+            self._active.write(data)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self.fsyncs += 1
+            segment[0] += len(records)
+            segment[1] += len(data)
+            self.appended += len(records)
+
+    def _seal(self):
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+        self._active_seq += 1
+
+    def oldest(self) -> Optional[Tuple[int, List[bytes]]]:
+        """
+        Returns the sequence number and records of the oldest segment, or
+        None if the spool is empty. The segment stays on disk until
+        `remove` is called.
+        """
+        with self._lock:
+            if not self._segments:
+                return None
+            seq = min(self._segments)
+            if seq == self._active_seq:
+                self._seal()
+
+        records = []
+        with open(self._path(seq), "rb") as f:
+            while True:
+                header = f.read(self._HEADER.size)
+                if len(header) < self._HEADER.size:
+                    break
+                _, length = self._HEADER.unpack(header)
+                records.append(f.read(length))
+        return seq, records
+
+    def remove(self, seq: int):
+        """
+        Deletes a segment once its records have been replayed.
+        """
+        with self._lock:
+            count = self._segments.pop(seq)[0]
+        os.remove(self._path(seq))
+        self.replayed += count
+
+    def quarantine(self, records: List[bytes]):
+        """
+        Appends records the database refuses to `rejected.log`, in the
+        segment format, so they are kept for inspection but never replayed.
+        """
+        if not records:
+            return
+        now = time.time()
+        data = b"".join(self._HEADER.pack(now, len(record)) + record for record in records)
+        with self._lock:
+            with open(os.path.join(self.directory, "rejected.log"), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.rejected += len(records)
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = list(self._segments.values())
+        first = min((segment[2] for segment in segments if segment[2] is not None), default=None)
+        return {
+            "segments": len(segments),
+            "pending": sum(segment[0] for segment in segments),
+            "bytes": sum(segment[1] for segment in segments),
+            "oldest_age_seconds": round(time.time() - first, 1) if first is not None else None,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "fsyncs": self.fsyncs,
+        }
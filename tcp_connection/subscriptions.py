@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy.future import select
+
+from db.engine import async_session
+from building_gate.models import Gate
+from camera.models import Camera
+
+
+PLATES = "plates_data"
+LIVE = "live"
+MESSAGE_TYPES = (PLATES, LIVE)
+# Room suffix for sessions that did not filter by gate
+ALL_GATES = "*"
+
+# Event formats: JSON strings with base64 images (the original format), or
+# dicts with the images as binary attachments
+JSON = "json"
+BINARY = "binary"
+FORMATS = (JSON, BINARY)
+
+# plates_data groupings: one event per car, each carrying the scene image
+# (the original behaviour), or one event per message listing its cars
+PER_CAR = "per_car"
+GROUPED = "grouped"
+GROUPINGS = (PER_CAR, GROUPED)
+
+
+def room_name(message_type: str, gate: str, format: str = JSON, grouping: str = PER_CAR) -> str:
+    name = f"{message_type}:{gate}"
+    if format != JSON:
+        name += f":{format}"
+    if grouping != PER_CAR:
+        name += f":{grouping}"
+    return name
+
+
+def rooms_for(message_type: str, gate: str, format: str = JSON, grouping: str = PER_CAR) -> List[str]:
+    """
+    Rooms whose members want `message_type` events from `gate` in `format` and `grouping`.
+    """
+    return [
+        room_name(message_type, gate, format, grouping),
+        room_name(message_type, ALL_GATES, format, grouping),
+    ]
+
+
+@dataclass
+class Subscription:
+    """
+    What a Socket.IO session wants to receive.
+    `gates` is None for every gate; new sessions get every gate and type,
+    matching the behaviour before subscriptions existed.
+    """
+    gates: Optional[Set[str]] = None
+    message_types: Set[str] = field(default_factory=lambda: set(MESSAGE_TYPES))
+    format: str = JSON
+    grouping: str = PER_CAR
+
+    def rooms(self) -> Iterable[str]:
+        for message_type in self.message_types:
+            # Only plates_data events come in more than one grouping
+            grouping = self.grouping if message_type == PLATES else PER_CAR
+            for gate in ([ALL_GATES] if self.gates is None else self.gates):
+                yield room_name(message_type, gate, self.format, grouping)
+
+    def wants(self, message_type: str, gate: str) -> bool:
+        return message_type in self.message_types and (self.gates is None or gate in self.gates)
+
+
+# Socket.IO sid -> its current subscription
+subscriptions: Dict[str, Subscription] = {}
+
+
+async def resolve_gates(gates: List = (), cameras: List[int] = (), buildings: List[int] = ()) -> Optional[Set[str]]:
+    """
+    Resolves gate names/ids, camera ids and building ids to the gate names
+    used in LPR messages. Returns None when no filter was given.
+    """
+    if not gates and not cameras and not buildings:
+        return None
+
+    names = {gate for gate in gates if isinstance(gate, str)}
+    gate_ids = [gate for gate in gates if isinstance(gate, int)]
+
+    async with async_session() as session:
+        if gate_ids:
+            result = await session.execute(select(Gate.name).where(Gate.id.in_(gate_ids)))
+            names.update(result.scalars().all())
+        if cameras:
+            result = await session.execute(
+                select(Gate.name).join(Camera, Camera.gate_id == Gate.id).where(Camera.id.in_(cameras))
+            )
+            names.update(result.scalars().all())
+        if buildings:
+            result = await session.execute(select(Gate.name).where(Gate.building_id.in_(buildings)))
+            names.update(result.scalars().all())
+
+    return names
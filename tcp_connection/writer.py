@@ -0,0 +1,339 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import DateTime, insert, text
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+
+from settings import settings
+from db.engine import async_session
+from client.models import PlateData, ImageData
+from plates.fuzzy import update_known_plates
+from plates.rollups import update_rollups
+from tcp_connection.spool import SegmentedSpool
+
+
+PLATE = "plate"
+IMAGE = "image"
+
+# Errors raised while the database is down or unreachable
+UNAVAILABLE_ERRORS = (SQLAlchemyError, OSError, asyncio.TimeoutError)
+# Errors caused by the rows themselves; retrying them cannot succeed
+REJECTED_ERRORS = (IntegrityError, DataError)
+
+# Columns turned back into datetimes when rows are read from the spool
+_DATETIME_COLUMNS = {
+    kind: {column.name for column in model.__table__.columns if isinstance(column.type, DateTime)}
+    for kind, model in ((PLATE, PlateData), (IMAGE, ImageData))
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_spool_record(kind: str, row: Dict[str, Any]) -> bytes:
+    return json.dumps([kind, row], default=_json_default).encode()
+
+
+def decode_spool_record(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    kind, row = json.loads(data)
+    for column in _DATETIME_COLUMNS[kind]:
+        if isinstance(row.get(column), str):
+            row[column] = datetime.fromisoformat(row[column])
+    return kind, row
+
+
+class PlateDataWriter:
+    """
+    Write-behind pipeline for `PlateData` and `ImageData` rows.
+
+    Rows are queued by the ingest handlers and a single writer task flushes
+    them as multi-row inserts, one transaction per batch. A batch is flushed
+    when it reaches `batch_size` rows or when the oldest row in it has
+    waited `linger_ms`, whichever comes first.
+
+    With a `spool_dir`, batches that cannot be written (the database is down)
+    or should not wait (the queue is backed up) go to a `SegmentedSpool`
+    instead of being dropped. Once a batch has failed, later batches are
+    spooled without trying the database until the replayer reaches it
+    again; the replayer then drains the spool a segment per transaction.
+
+    A batch the database rejects is split in halves until the offending
+    rows are isolated, so only they are lost (or quarantined in the spool
+    directory) and the rest of the batch is still saved.
+    """
+
+    def __init__(self, batch_size: int = settings.PLATE_WRITER_BATCH_SIZE,
+                 linger_ms: int = settings.PLATE_WRITER_LINGER_MS,
+                 max_queue_size: int = settings.PLATE_WRITER_QUEUE_SIZE,
+                 spool_dir: Optional[str] = settings.PLATE_SPOOL_DIR,
+                 spool_segment_bytes: int = settings.PLATE_SPOOL_SEGMENT_BYTES,
+                 replay_interval: float = settings.PLATE_SPOOL_REPLAY_INTERVAL):
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.queue: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self.spool_dir = spool_dir
+        self.spool_segment_bytes = spool_segment_bytes
+        self.replay_interval = replay_interval
+        self.spool: Optional[SegmentedSpool] = None
+        self._replayer: Optional[asyncio.Task] = None
+        # Set while the database is considered unavailable
+        self.spooling = False
+
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+        self.spooled_rows = 0
+
+    def start(self):
+        """
+        Starts the writer task, and the spool replayer if spooling is
+        enabled, on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self.spool_dir and self.spool is None:
+            self.spool = SegmentedSpool(self.spool_dir, self.spool_segment_bytes)
+            self._replayer = loop.create_task(self._replay())
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        print("[INFO] Plate data writer started")
+
+    async def stop(self):
+        """
+        Flushes everything queued so far and stops the writer task.
+        Spooled rows stay on disk and are replayed on the next start.
+        """
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+        if self._replayer is not None:
+            self._replayer.cancel()
+            await asyncio.gather(self._replayer, return_exceptions=True)
+            self._replayer = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        print("[INFO] Plate data writer stopped")
+
+    @property
+    def backed_up(self) -> bool:
+        """
+        True while the queue is more than half full, i.e. the database is
+        not keeping up.
+        """
+        return self.queue.qsize() * 2 > self.queue.maxsize
+
+    async def put_plate(self, row: Dict[str, Any]):
+        """
+        Queues a `PlateData` row, waiting while the queue is full.
+        """
+        await self.queue.put((PLATE, row))
+
+    async def put_image(self, row: Dict[str, Any]):
+        """
+        Queues an `ImageData` row, waiting while the queue is full.
+        """
+        await self.queue.put((IMAGE, row))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        if self.spool is not None and (self.spooling or self.backed_up):
+            await self._spool(batch)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self._insert(batch)
+            self.flushed_rows += len(batch)
+        except REJECTED_ERRORS as e:
+            print(f"[ERROR] Database rejected a batch of {len(batch)} plate/image rows, retrying it in parts: {str(e)}")
+            rejected, unwritten = await self._insert_isolating(batch)
+            self.flushed_rows += len(batch) - len(rejected) - len(unwritten)
+            await self._quarantine(rejected)
+            if unwritten:
+                await self._unavailable(unwritten, "the database became unavailable")
+        except UNAVAILABLE_ERRORS as e:
+            await self._unavailable(batch, str(e))
+
+        latency = time.perf_counter() - start
+        self.flush_count += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._total_flush_latency += latency
+
+    async def _unavailable(self, batch: List[Tuple[str, Dict[str, Any]]], error: str):
+        if self.spool is not None:
+            print(f"[ERROR] Could not save {len(batch)} plate/image rows, spooling them: {error}")
+            self.spooling = True
+            await self._spool(batch)
+        else:
+            self.failed_rows += len(batch)
+            print(f"[ERROR] Could not save {len(batch)} plate/image rows: {error}")
+
+    async def _insert_isolating(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Inserts a batch the database rejected by halves, down to single
+        rows. Returns the rows it rejected and, if the database became
+        unavailable meanwhile, the rows not attempted yet.
+        """
+        def split(part):
+            middle = len(part) // 2
+            # Popped from the end, so the first half goes in first
+            return [part[middle:], part[:middle]]
+
+        pending = split(batch) if len(batch) > 1 else []
+        rejected = [] if pending else batch
+        while pending:
+            part = pending.pop()
+            try:
+                await self._insert(part)
+            except REJECTED_ERRORS as e:
+                if len(part) == 1:
+                    kind, row = part[0]
+                    print(f"[ERROR] Database rejected {kind} row {row}: {str(e)}")
+                    rejected.extend(part)
+                else:
+                    pending += split(part)
+            except UNAVAILABLE_ERRORS:
+                return rejected, [item for chunk in [part, *reversed(pending)] for item in chunk]
+        return rejected, []
+
+    async def _quarantine(self, rejected: List[Tuple[str, Dict[str, Any]]]):
+        if not rejected:
+            return
+        self.rejected_rows += len(rejected)
+        if self.spool is None:
+            return
+        try:
+            await asyncio.to_thread(self.spool.quarantine, [encode_spool_record(kind, row) for kind, row in rejected])
+        except OSError as e:
+            print(f"[ERROR] Could not quarantine {len(rejected)} rejected plate/image rows: {str(e)}")
+
+    async def _insert(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Inserts `batch` in one transaction, as one multi-row insert per
+        table and `batch_size` rows, together with its traffic rollups and
+        known plates.
+        """
+        plates = [row for kind, row in batch if kind == PLATE]
+        images = [row for kind, row in batch if kind == IMAGE]
+
+        async with async_session() as session:
+            try:
+                for start in range(0, len(plates), self.batch_size):
+                    await session.execute(insert(PlateData), plates[start:start + self.batch_size])
+                for start in range(0, len(images), self.batch_size):
+                    await session.execute(insert(ImageData), images[start:start + self.batch_size])
+                await update_rollups(session, plates)
+                await update_known_plates(session, plates)
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+
+    async def _spool(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        records = [encode_spool_record(kind, row) for kind, row in batch]
+        try:
+            await asyncio.to_thread(self.spool.append, records)
+            self.spooled_rows += len(batch)
+        except OSError as e:
+            self.failed_rows += len(batch)
+            print(f"[ERROR] Could not spool {len(batch)} plate/image rows: {str(e)}")
+
+    async def _replay(self):
+        """
+        Drains the spool whenever it has rows and the database answers,
+        one segment per transaction, oldest first.
+        """
+        while True:
+            if not self.spool.pending:
+                await asyncio.sleep(self.replay_interval)
+                continue
+            try:
+                async with async_session() as session:
+                    await session.execute(text("SELECT 1"))
+            except UNAVAILABLE_ERRORS:
+                await asyncio.sleep(self.replay_interval)
+                continue
+
+            # The database is back; new batches can go straight to it again
+            self.spooling = False
+            oldest = await asyncio.to_thread(self.spool.oldest)
+            if oldest is None:
+                continue
+            seq, records = oldest
+            batch = [decode_spool_record(record) for record in records]
+            try:
+                await self._insert(batch)
+            except REJECTED_ERRORS as e:
+                print(f"[ERROR] Database rejected spool segment {seq}, retrying it in parts: {str(e)}")
+                rejected, unwritten = await self._insert_isolating(batch)
+                await self._quarantine(rejected)
+                try:
+                    # The rest of the segment goes back to the spool, the saved part must not be replayed
+                    await asyncio.to_thread(self.spool.append, [encode_spool_record(kind, row) for kind, row in unwritten])
+                except OSError as e:
+                    print(f"[ERROR] Could not spool the unreplayed part of segment {seq}, keeping it whole: {str(e)}")
+                    continue
+                await asyncio.to_thread(self.spool.remove, seq)
+                print(f"[INFO] Replayed {len(batch) - len(rejected) - len(unwritten)} spooled plate/image rows, "
+                      f"{len(rejected)} rejected")
+            except UNAVAILABLE_ERRORS as e:
+                print(f"[ERROR] Could not replay spool segment {seq}: {str(e)}")
+                await asyncio.sleep(self.replay_interval)
+            else:
+                await asyncio.to_thread(self.spool.remove, seq)
+                print(f"[INFO] Replayed {len(records)} spooled plate/image rows")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "rejected_rows": self.rejected_rows,
+            "flush_count": self.flush_count,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 2),
+            "avg_flush_latency_ms": round(self._total_flush_latency / self.flush_count * 1000, 2) if self.flush_count else 0.0,
+            "max_flush_latency_ms": round(self.max_flush_latency * 1000, 2),
+            "spooling": self.spooling,
+            "spooled_rows": self.spooled_rows,
+            "spool": self.spool.stats() if self.spool is not None else None,
+        }
+
+
+plate_writer = PlateDataWriter()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import shutil
 from typing import List, Optional
@@ -20,7 +21,7 @@ from authentication.access_level import (get_user,
     get_admin_user,
     get_admin_or_staff_user,
 )
-from minio_db.minio_manager import minio_client
+from utils.image_store import profile_image_store
 from settings import settings
 from user.models import UserType
 
@@ -60,9 +61,9 @@ async def api_create_user(username: str = Form(...),
     new_user =  await UserOperation(db).create_user(user)
     if profile_image:
         try:
-            object_name = upload_image(profile_image, new_user.id, profile_image.filename)
+            object_name = await asyncio.to_thread(upload_image, profile_image, new_user.id, profile_image.filename)
             # Optionally, generate a pre-signed URL
-            image_url = get_image_url(object_name)
+            image_url = await asyncio.to_thread(get_image_url, object_name) or f"/users/{new_user.id}/profile-image"
             # Update the user's profile_image field
             # new_user.profile_image = object_name
             await UserOperation(db).update_user(new_user.id, {"profile_image": object_name})
@@ -96,7 +97,7 @@ async def api_read_user(user_id: int, db: AsyncSession=Depends(get_db), current_
     #     raise HTTPException(status.HTTP_404_NOT_FOUND, "user not found!")
     if user.profile_image:
         try:
-            image_url = get_image_url(user.profile_image)
+            image_url = await asyncio.to_thread(get_image_url, user.profile_image) or f"/users/{user.id}/profile-image"
             return {
                 **UserInDB.from_orm(user).dict(),
                 "profile_image_url": image_url
@@ -128,7 +129,7 @@ async def get_profile_image(
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
-    Fetch and serve the user's profile image from MinIO.
+    Fetch and serve the user's profile image from the profile image store.
     Accessible by all authenticated and active users.
     """
     user = await UserOperation(db).get_user(user_id)
@@ -136,8 +137,10 @@ async def get_profile_image(
         raise HTTPException(status_code=404, detail="Profile image not found.")
 
     try:
-        response = minio_client.get_object(settings.MINIO_BUCKET_NAME, user.profile_image)
-        return StreamingResponse(response, media_type="image/jpeg")  # Adjust media_type as needed
-    except S3Error as e:
+        chunks = await asyncio.to_thread(profile_image_store().stream, user.profile_image)
+        return StreamingResponse(chunks, media_type="image/jpeg")  # Adjust media_type as needed
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile image not found.")
+    except Exception as e:
         print(f"Error fetching image: {e}")
         raise HTTPException(status.HTTP_409_CONFLICT, detail="Failed to fetch profile image.")
@@ -1,21 +1,18 @@
 import os
-from minio import Minio
-from minio.error import S3Error
+from typing import Optional
 from uuid import uuid4
-from datetime import timedelta
 
-from settings import settings
-from minio_db.minio_manager import minio_client
+from utils.image_store import profile_image_store
 
 
 def upload_image(file, user_id: int, filename: str) -> str:
     """
-    Uploads an image to MinIO and returns the object name.
+    Uploads an image to the profile image store and returns its key.
 
     :param file: The file object (UploadFile)
     :param user_id: ID of the user uploading the image
     :param filename: Original filename
-    :return: Object name in MinIO
+    :return: Image store key
     """
     # Generate a unique object name to prevent collisions
     extension = os.path.splitext(filename)[1]
@@ -27,32 +24,26 @@ def upload_image(file, user_id: int, filename: str) -> str:
     file.file.seek(0)
 
     try:
-        minio_client.put_object(
-            bucket_name=settings.MINIO_BUCKET_NAME,
-            object_name=object_name,
-            data=file.file,
-            length=file_size,  # -1 means the length is unknown; minio can handle streaming
-            content_type=file.content_type
-        )
-    except S3Error as e:
+        profile_image_store().put(object_name, file.file, length=file_size, content_type=file.content_type)
+    except Exception as e:
         print(f"Error uploading image: {e}")
         raise e
 
     return object_name
 
 
-def get_image_url(object_name: str, expires: int = 3600) -> str:
+def get_image_url(object_name: str, expires: int = 3600) -> Optional[str]:
     """
     Generates a pre-signed URL for the image.
 
-    :param object_name: The object name in MinIO
+    :param object_name: The image store key
     :param expires: Time in seconds for the URL to expire
-    :return: Pre-signed URL as a string
+    :return: Pre-signed URL as a string, or None if the store has no URLs
+        and the image is served by GET /users/{user_id}/profile-image
     """
     try:
-        expires_delta = timedelta(seconds=expires)
-        url = minio_client.presigned_get_object(settings.MINIO_BUCKET_NAME, object_name, expires=expires_delta)
-    except S3Error as e:
+        url = profile_image_store().url(object_name, expires)
+    except Exception as e:
         print(f"Error generating pre-signed URL: {e}")
         raise e
 
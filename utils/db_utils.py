@@ -1,13 +1,61 @@
+import re
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
 
 from settings import settings
 from authentication.auth import get_password_hash
+from db.partitions import is_partitioned
 from user.models import DBUser, UserType
 
 
+# Idempotent DDL for columns added after a table was first created;
+# `create_all` only creates missing tables, never missing columns
+SCHEMA_UPGRADES = [
+    "ALTER TABLE plate_data ADD COLUMN IF NOT EXISTS hits INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE plate_data ADD COLUMN IF NOT EXISTS scene_image_key VARCHAR",
+]
+
+
+# Indexes declared on models after their tables were first created. Built
+# CONCURRENTLY so large tables keep taking writes meanwhile (except on
+# partitioned tables, where Postgres does not support it)
+SCHEMA_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plate_data_timestamp_id ON plate_data (timestamp, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plate_data_plate_number_timestamp_id ON plate_data (plate_number, timestamp, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plate_data_gate_timestamp_id ON plate_data (gate, timestamp, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_data_plate_number_gate_timestamp ON image_data (plate_number, gate, timestamp)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_daily_plates_plate_key_gate_day ON daily_plates (plate_key, gate, day)",
+    # Fuzzy plate search: trigrams of the distinct normalised plates
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_known_plates_plate_key_trgm ON known_plates USING gin (plate_key gin_trgm_ops)",
+]
+
+
+async def upgrade_schema(conn: AsyncConnection):
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+
+
+async def create_indexes(engine: AsyncEngine):
+    """
+    Runs SCHEMA_INDEXES. CREATE INDEX CONCURRENTLY cannot run inside a
+    transaction, so this uses its own autocommit connection. A failing
+    statement (e.g. no privilege to create pg_trgm) does not stop the rest.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in SCHEMA_INDEXES:
+            table = re.search(r" ON (\w+)", statement)
+            if table and await is_partitioned(conn, table.group(1)):
+                statement = statement.replace(" CONCURRENTLY", "")
+            try:
+                await conn.execute(text(statement))
+            except SQLAlchemyError as e:
+                print(f"[ERROR] Schema statement failed: {statement}: {str(e)}")
+
+
 async def create_default_admin(session: AsyncSession):
     pass
     result = await session.execute(select(DBUser).filter(DBUser.username == settings.ADMIN_USERNAME))
@@ -0,0 +1,271 @@
+import io
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+from uuid import uuid4
+
+from minio.error import S3Error
+
+from settings import settings
+from minio_db.minio_manager import get_minio_client
+
+
+# Size of the chunks images are streamed back in
+CHUNK_SIZE = 64 * 1024
+
+ImageSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class ImageStore(ABC):
+    """
+    Where images are kept, addressed by backend-neutral keys such as
+    "images/2024/11/1/gate_1/20241101_192712_04m33660_<uuid>.jpg".
+
+    All methods block; async code runs them on the image pool
+    (`utils.image_utils.get_image_executor`). A missing key raises
+    FileNotFoundError whatever the backend.
+    """
+    name = ""
+
+    @abstractmethod
+    def put(self, key: str, data: ImageSource, length: Optional[int] = None,
+            content_type: str = "image/jpeg"):
+        """
+        Stores `data` (bytes or a binary file object) under `key`.
+        `length` is only needed for file objects; it is measured when omitted.
+        """
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    def url(self, key: str, expires: int = 3600) -> Optional[str]:
+        """
+        Returns a URL clients can fetch the image from directly, or None if
+        the backend has none and the image must be served through the API.
+        """
+        return None
+
+    def get(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+    def stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Opens `key` right away (so a missing image raises here) and returns
+        an iterator over its content.
+        """
+        f = self.open(key)
+
+        def chunks():
+            try:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                f.close()
+        return chunks()
+
+
+def _as_bytes(data: ImageSource) -> bytes:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data)
+    return data.read()
+
+
+class LocalImageStore(ImageStore):
+    """
+    Keys are paths relative to `root`. Writes go to a temporary file that is
+    renamed into place, so readers never see a partial image.
+    """
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        # Directories already known to exist, so makedirs runs once per directory
+        self._created_dirs = set()
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.isabs(key) or os.path.relpath(path, self.root).startswith(os.pardir):
+            raise ValueError(f"Invalid image key: {key}")
+        return path
+
+    def _ensure_directory(self, directory: str):
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def put(self, key, data, length=None, content_type="image/jpeg"):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        tmp_path = f"{path}.{uuid4().hex}.tmp"
+        try:
+            f = open(tmp_path, "xb")
+        except FileNotFoundError:
+            # The directory was removed since it was cached
+            self._created_dirs.discard(directory)
+            self._ensure_directory(directory)
+            f = open(tmp_path, "xb")
+        with f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            else:
+                while True:
+                    chunk = data.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+
+    def open(self, key):
+        return open(self._path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class MinioImageStore(ImageStore):
+    """
+    Keys are object names in `bucket`, which is created on first upload.
+    Objects larger than `part_size` are uploaded in parts by the MinIO client.
+    """
+    name = "minio"
+
+    def __init__(self, bucket: str, part_size: int):
+        self.bucket = bucket
+        self.part_size = part_size
+        self._bucket_checked = False
+        self._bucket_lock = threading.Lock()
+
+    def _ensure_bucket(self):
+        if self._bucket_checked:
+            return
+        with self._bucket_lock:
+            client = get_minio_client()
+            if not self._bucket_checked and not client.bucket_exists(self.bucket):
+                client.make_bucket(self.bucket)
+                print(f"Bucket '{self.bucket}' created.")
+            self._bucket_checked = True
+
+    def put(self, key, data, length=None, content_type="image/jpeg"):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            length = len(data)
+            data = io.BytesIO(data)
+        self._ensure_bucket()
+        get_minio_client().put_object(
+            bucket_name=self.bucket,
+            object_name=key,
+            data=data,
+            length=length if length is not None else -1,  # -1 streams it in parts of part_size
+            content_type=content_type,
+            part_size=self.part_size,
+        )
+
+    def open(self, key):
+        try:
+            response = get_minio_client().get_object(self.bucket, key)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise FileNotFoundError(key) from e
+            raise
+        return _MinioObject(response)
+
+    def delete(self, key):
+        get_minio_client().remove_object(self.bucket, key)
+
+    def url(self, key, expires=3600):
+        return get_minio_client().presigned_get_object(self.bucket, key, expires=timedelta(seconds=expires))
+
+
+class _MinioObject(io.RawIOBase):
+    """
+    A MinIO response as a file object; closing it hands the connection back
+    to the pool.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._response.read(None if size is None or size < 0 else size)
+
+    def close(self):
+        if not self.closed:
+            self._response.close()
+            self._response.release_conn()
+        super().close()
+
+
+class MemoryImageStore(ImageStore):
+    """
+    Keeps images in a dict; a stand-in for tests and local development.
+    """
+    name = "memory"
+
+    def __init__(self):
+        self._objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, data, length=None, content_type="image/jpeg"):
+        data = _as_bytes(data)
+        with self._lock:
+            self._objects[key] = data
+
+    def open(self, key):
+        with self._lock:
+            if key not in self._objects:
+                raise FileNotFoundError(key)
+            return io.BytesIO(self._objects[key])
+
+    def delete(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+
+_stores: Dict[Tuple[str, str], ImageStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _create_store(backend: str, bucket: str) -> ImageStore:
+    if backend == "local":
+        return LocalImageStore(settings.IMAGE_STORE_LOCAL_DIR)
+    if backend == "minio":
+        return MinioImageStore(bucket, settings.IMAGE_STORE_PART_SIZE)
+    if backend == "memory":
+        return MemoryImageStore()
+    raise ValueError(f"Unknown image store backend: {backend}")
+
+
+def get_image_store(backend: str, bucket: str = settings.MINIO_BUCKET_NAME) -> ImageStore:
+    """
+    Returns the shared store for `backend` ("local", "minio" or "memory");
+    `bucket` is the MinIO bucket a "minio" store keeps its images in.
+    """
+    key = (backend, bucket if backend == "minio" else "")
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = _create_store(backend, bucket)
+        return _stores[key]
+
+
+def plate_image_store() -> ImageStore:
+    return get_image_store(settings.PLATE_IMAGE_STORE, settings.MINIO_PLATE_BUCKET_NAME)
+
+
+def profile_image_store() -> ImageStore:
+    return get_image_store(settings.PROFILE_IMAGE_STORE, settings.MINIO_BUCKET_NAME)
@@ -1,34 +1,77 @@
-import aiofiles
-import os
+import asyncio
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
+from settings import settings
 from client.models import ImageData
+from utils.image_store import plate_image_store
 
 
-async def save_image(base64_encoded_image: str, plate_number: str, gate: str) -> str:
+_image_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_image_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded pool that decodes and writes images off the event loop.
+    """
+    global _image_executor
+    with _executor_lock:
+        if _image_executor is None:
+            _image_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WRITE_WORKERS,
+                                                 thread_name_prefix="image-writer")
+        return _image_executor
+
+
+def shutdown_image_executor():
+    """
+    Waits for pending image writes and stops the pool.
     """
-    Saves the base64-encoded image to a file asynchronously.
+    global _image_executor
+    with _executor_lock:
+        executor, _image_executor = _image_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def plate_image_key(plate_number: str, gate: str, timestamp: datetime) -> str:
+    """
+    Backend-neutral key of a plate crop, stored in `ImageData.file_path`.
+    Keys keep the images/<date>/<gate> layout of the local files written
+    before the image store existed, so those rows still resolve.
+    """
+    # Unique per image: several crops of one plate can arrive within a second
+    file_name = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{plate_number}_{uuid4().hex}.jpg"
+    return f"images/{timestamp.year}/{timestamp.month}/{timestamp.day}/{gate}/{file_name}"
+
+
+def write_image(base64_encoded_image, plate_number: str, gate: str) -> str:
+    """
+    Decodes a base64 image and stores it in the plate image store.
+    Blocking; `save_image` runs it on the image pool.
     """
     # Decode the base64 image
     image_data = base64.b64decode(base64_encoded_image)
 
-    # Create the directory based on the current date and gate
-    timestamp = datetime.now()
-    directory = f"images/{timestamp.year}/{timestamp.month}/{timestamp.day}/{gate}"
-    os.makedirs(directory, exist_ok=True)
+    key = plate_image_key(plate_number, gate, datetime.now())
+    plate_image_store().put(key, image_data, content_type="image/jpeg")
+    return key
 
-    # Define the image file path
-    file_name = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{plate_number}.jpg"
-    file_path = os.path.join(directory, file_name)
 
-    # Save the image asynchronously
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(image_data)
-
-    return file_path
+async def save_image(base64_encoded_image: str, plate_number: str, gate: str) -> str:
+    """
+    Saves the base64-encoded image without blocking the event loop and
+    returns its image store key.
+    The image may be given as a str or as a bytes-like view of the payload.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_executor(), write_image, base64_encoded_image, plate_number, gate)
 
 
 async def save_image_metadata(db_session: AsyncSession, file_path: str, plate_number: str, gate: str):
@@ -0,0 +1,44 @@
+import time
+from typing import Any, Dict, Optional
+
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class ReadinessRegistry:
+    """
+    Startup state of each subsystem, reported by GET /ready.
+    The app is ready once every required subsystem is; optional ones
+    (e.g. MinIO) are reported but do not hold back traffic.
+    """
+
+    def __init__(self):
+        self._subsystems: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, required: bool = True):
+        self._subsystems[name] = {"state": PENDING, "required": required, "since": time.time(), "error": None}
+
+    def mark_ready(self, name: str):
+        self._set(name, READY)
+
+    def mark_failed(self, name: str, error: Optional[str]):
+        self._set(name, FAILED, error)
+
+    def _set(self, name: str, state: str, error: Optional[str] = None):
+        subsystem = self._subsystems.setdefault(name, {"required": False})
+        subsystem.update(state=state, since=time.time(), error=error)
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            subsystem["state"] == READY
+            for subsystem in self._subsystems.values() if subsystem["required"]
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "subsystems": self._subsystems}
+
+
+readiness = ReadinessRegistry()